@@ -1,15 +1,29 @@
 from textwrap import dedent
 from typing import List, Dict, Optional
 import asyncio
+import contextvars
+import hashlib
+import json
 import logging
+import re
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from pydantic import BaseModel
 from agno.agent import Agent
 from agno.models.google import Gemini
 from agno.team import Team
 from agno.tools.duckduckgo import DuckDuckGoTools
 from agno.tools.newspaper4k import Newspaper4kTools
-import random
+import os
 import time
+from rate_limiter import get_rate_limiter, estimate_tokens, call_with_rate_limit
+from cache import DiskCache
+from compaction import collapse_repeated_paragraphs, compact_research, research_budget
+from patching import PatchError, apply_edits, parse_edits
+from cancellation import cancellable, is_cancelled
+from stage_engine import PipelineState, Stage, StageGraph, record_stage_usage, record_uncompacted_tokens
+from tag_generator import TagGenerator
+from source_cache import SourceStore, CachedDuckDuckGoTools, CachedNewspaper4kTools
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,6 +32,93 @@ logger = logging.getLogger(__name__)
 # Create a shared Gemini model instance to reuse across agents
 gemini_model = Gemini(id="gemini-2.0-flash")
 
+# Expected output size of one agent step, used to reserve token budget up front
+OUTPUT_TOKEN_ESTIMATE = int(os.getenv('GEMINI_OUTPUT_TOKEN_ESTIMATE', '2000'))
+
+# Pipeline stage each agent produces, used to look up its concurrency limit
+AGENT_STAGES = {
+    "Editorial Manager": "planning",
+    "Research Specialist": "research",
+    "Content Writer": "draft",
+    "Content Editor": "final",
+}
+
+# Maximum concurrent agent calls per stage (STAGE_CONCURRENCY_<STAGE> overrides the default)
+DEFAULT_STAGE_CONCURRENCY = int(os.getenv('STAGE_CONCURRENCY', '4'))
+STAGE_CONCURRENCY = {
+    stage: int(os.getenv(f'STAGE_CONCURRENCY_{stage.upper()}', str(DEFAULT_STAGE_CONCURRENCY)))
+    for stage in AGENT_STAGES.values()
+}
+
+# 'patch' has the editor return find/replace edits applied locally (falling
+# back to a rewrite if they don't apply); 'rewrite' regenerates the article
+EDITING_MODE = os.getenv('EDITING_MODE', 'patch')
+
+# Optional stages appended after editing, e.g. "tagging,moderation"
+EXTRA_STAGES = [name.strip() for name in os.getenv('PIPELINE_EXTRA_STAGES', '').split(',') if name.strip()]
+
+# Parallel sub-research calls per article, by research scope (1 = single call)
+RESEARCH_FANOUT = {
+    scope: int(os.getenv(f'RESEARCH_FANOUT_{scope.upper()}', default))
+    for scope, default in (('basic', '1'), ('thorough', '3'), ('comprehensive', '5'))
+}
+
+# Agents (and their tools) are synchronous, so calls run on this bounded pool
+# to keep the event loop free for other pipelines
+_agent_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('AGENT_THREADS', str(sum(STAGE_CONCURRENCY.values())))),
+    thread_name_prefix='agent'
+)
+
+# Per-event-loop stage semaphores (asyncio primitives must not cross loops)
+_stage_semaphores: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+# Content-addressed cache of agent responses, so reruns and resumes don't
+# pay again for identical prompts. Set AGENT_CACHE_DIR to '' to disable.
+_response_cache_dir = os.getenv('AGENT_CACHE_DIR', 'data/agent_cache')
+response_cache = DiskCache(
+    _response_cache_dir,
+    max_bytes=int(os.getenv('AGENT_CACHE_MAX_BYTES', str(256 * 1024 * 1024))),
+    ttl=float(os.getenv('AGENT_CACHE_TTL', str(7 * 24 * 3600)))
+) if _response_cache_dir else None
+
+class CachedRunResponse:
+    """Stand-in for an agent RunResponse served from the response cache"""
+
+    def __init__(self, content: str):
+        self.content = content
+        self.metrics = {}
+
+# Set for a run that must not replay cached responses: an explicit
+# regeneration, or a retry after a failed attempt. Fresh responses still
+# replace the cached ones.
+fresh_responses: contextvars.ContextVar = contextvars.ContextVar('fresh_responses', default=False)
+
+def response_cache_key(agent, prompt: str) -> str:
+    """Hash of everything that determines an agent's output for a prompt"""
+    model_id = getattr(agent.model, 'id', None)
+    material = json.dumps([agent.name, model_id, agent.description, prompt])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+def _stage_semaphore(agent) -> Optional[asyncio.Semaphore]:
+    stage = AGENT_STAGES.get(agent.name)
+    if stage is None:
+        return None
+    semaphores = _stage_semaphores.setdefault(asyncio.get_running_loop(), {})
+    if stage not in semaphores:
+        semaphores[stage] = asyncio.Semaphore(STAGE_CONCURRENCY[stage])
+    return semaphores[stage]
+
+async def run_agent(agent, prompt):
+    """
+    Run an agent without blocking the event loop.
+
+    Each call works on a copy of the agent, since Agent keeps per-run state
+    (run_response, run_id, memory) that concurrent runs would otherwise share.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_agent_executor, lambda: agent.deep_copy().run(prompt))
+
 class ArticlePlan(BaseModel):
     title: str
     outline: List[str]
@@ -30,47 +131,228 @@ class ResearchResults(BaseModel):
     key_findings: List[str]
     quotes: List[Dict[str, str]]
 
-async def exponential_backoff_retry(func, max_retries=5, base_delay=10):
+def _plan_list_items(plan: str, include: str, exclude: Optional[str] = None) -> List[tuple]:
     """
-    Execute a function with exponential backoff retry logic.
-    
-    Args:
-        func: Async function to execute
-        max_retries: Maximum number of retry attempts
-        base_delay: Base delay in seconds between retries
+    List items from the plan sections whose heading matches `include`.
+
+    Headings are markdown headings or bold lines. Deeper headings inside a
+    matching section count as top-level items (outlines often use them).
+
+    Returns:
+        List of (indent, text) tuples in plan order
+    """
+    items = []
+    section_level = None
+    nested = 0  # Bullets under a sub-heading are notes on that sub-heading
+    for line in plan.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        heading = re.match(r'^(?:(#+)\s*|\*\*|\d+\.\s+\*\*)(.+?)(?:\*\*)?:?(?:\*\*)?$', stripped)
+        is_heading = heading and (stripped.startswith('#') or stripped.endswith('**') or stripped.endswith('**:'))
+        # "1. **Intro**" under a markdown heading is a list item, not a heading
+        if is_heading and stripped[0].isdigit() and section_level:
+            is_heading = False
+        if is_heading:
+            level = len(heading.group(1) or '')
+            title = re.sub(r'\*\*|__', '', heading.group(2)).strip()
+            if section_level is not None and level > section_level > 0:
+                items.append((0, title))
+                nested = 1
+                continue
+            matches = re.search(include, title, re.IGNORECASE) and not (
+                exclude and re.search(exclude, title, re.IGNORECASE)
+            )
+            section_level = level if matches else None
+            nested = 0
+            continue
+        item = re.match(r'^(?:[-*+]|\d+[.)])\s+(.+)$', stripped)
+        if section_level is not None and item:
+            text = re.sub(r'\*\*|__', '', item.group(1)).strip()
+            if text:
+                items.append((len(line) - len(line.lstrip()) + nested, text[:300]))
+    return items
+
+def extract_research_areas(plan: str, limit: int) -> List[str]:
+    """
+    Pull the research areas out of a free-text plan.
+
+    Collects list items under headings about topics, areas or research (not
+    sources or the outline) and groups them into at most `limit` areas, so no
+    item is dropped when the plan lists more than we fan out to.
+    """
+    items = []
+    for _, text in _plan_list_items(plan, r'research|investigat|topic|area', r'source|outline'):
+        if text not in items:
+            items.append(text)
+
+    if limit <= 0 or not items:
+        return []
+    group_size = -(-len(items) // limit)  # ceiling division
+    return ['; '.join(items[i:i + group_size]) for i in range(0, len(items), group_size)]
+
+def extract_outline_sections(plan: str) -> List[str]:
     """
-    for attempt in range(max_retries):
+    Pull the article outline out of a free-text plan.
+
+    Top-level outline entries become sections; nested entries are kept as
+    notes on the section above them.
+    """
+    items = _plan_list_items(plan, r'outline|structure')
+    if not items:
+        return []
+    top_indent = min(indent for indent, _ in items)
+    sections = []
+    for indent, text in items:
+        if indent == top_indent or not sections:
+            sections.append(text)
+        else:
+            sections[-1] += f"\n  - {text}"
+    return sections
+
+def parse_research_results(content: str) -> ResearchResults:
+    """Parse a sub-research response into ResearchResults, keeping free text as findings"""
+    match = re.search(r'```(?:json)?\s*(\{.*\})\s*```', content, re.DOTALL) or re.search(r'(\{.*\})', content, re.DOTALL)
+    if match:
         try:
-            return await func()
-        except Exception as e:
-            if "429" in str(e) or "Too Many Requests" in str(e) or "RESOURCE_EXHAUSTED" in str(e):
-                if attempt < max_retries - 1:
-                    delay = base_delay * (2 ** attempt) + random.uniform(0, 1)
-                    logger.warning(f"Rate limit hit. Retrying in {delay:.1f} seconds...")
-                    await asyncio.sleep(delay)
-                    continue
-            raise
+            data = json.loads(match.group(1))
+            return ResearchResults(
+                sources=[{k: str(v) for k, v in s.items() if v is not None} for s in data.get('sources', []) if isinstance(s, dict)],
+                key_findings=[str(f) for f in data.get('key_findings', []) if f],
+                quotes=[{k: str(v) for k, v in q.items() if v is not None} for q in data.get('quotes', []) if isinstance(q, dict)]
+            )
+        except (ValueError, AttributeError) as e:
+            logger.warning(f"Could not parse research results as JSON: {str(e)}")
+    return ResearchResults(sources=[], key_findings=[content.strip()], quotes=[])
+
+def merge_research_results(results: List[ResearchResults]) -> ResearchResults:
+    """Combine sub-research results, dropping duplicate sources, findings and quotes"""
+    merged = ResearchResults(sources=[], key_findings=[], quotes=[])
+    seen_sources, seen_findings, seen_quotes = set(), set(), set()
+    for result in results:
+        for source in result.sources:
+            key = source.get('url') or source.get('title')
+            if key not in seen_sources:
+                seen_sources.add(key)
+                merged.sources.append(source)
+        for finding in result.key_findings:
+            if finding.lower() not in seen_findings:
+                seen_findings.add(finding.lower())
+                merged.key_findings.append(finding)
+        for quote in result.quotes:
+            key = (quote.get('quote') or '').lower()
+            if key not in seen_quotes:
+                seen_quotes.add(key)
+                merged.quotes.append(quote)
+    return merged
+
+def render_research_results(results: ResearchResults, areas: List[str]) -> str:
+    """Render merged research as the markdown document stored for the research stage"""
+    lines = ["# Research Findings", "", "## Research Areas"]
+    lines += [f"- {area}" for area in areas]
+    lines += ["", "## Key Facts and Findings"]
+    lines += [f"- {finding}" for finding in results.key_findings]
+    if results.quotes:
+        lines += ["", "## Expert Opinions and Quotes"]
+        for quote in results.quotes:
+            attribution = ', '.join(v for v in (quote.get('speaker'), quote.get('source')) if v)
+            lines.append(f"- \"{quote.get('quote', '')}\"" + (f" ({attribution})" if attribution else ''))
+    if results.sources:
+        lines += ["", "## Sources and References"]
+        for source in results.sources:
+            title, url = source.get('title') or source.get('url', ''), source.get('url')
+            lines.append(f"- [{title}]({url})" if url else f"- {title}")
+    return '\n'.join(lines) + '\n'
+
+# Approximate word counts for each target length
+TARGET_WORDS = {'short': 500, 'medium': 1000, 'long': 2000}
+
+def select_relevant_research(research: str, section: str, max_chars: int = 6000) -> str:
+    """
+    Pick the research lines most relevant to one outline section.
+
+    Lines are scored by word overlap with the section text and kept in their
+    original order until max_chars is reached.
+    """
+    words = lambda text: {w for w in re.findall(r'[a-z0-9]+', text.lower()) if len(w) > 3}
+    section_words = words(section)
+    lines = [line for line in research.splitlines() if line.strip()]
+    ranked = sorted(range(len(lines)), key=lambda i: -len(section_words & words(lines[i])))
 
-async def rate_limited_agent_step(agent, prompt, step_name):
+    if not ranked or not section_words & words(lines[ranked[0]]):
+        return research[:max_chars]
+
+    chosen, total = set(), 0
+    for i in ranked:
+        if not section_words & words(lines[i]):
+            break
+        if total + len(lines[i]) > max_chars:
+            continue
+        chosen.add(i)
+        total += len(lines[i]) + 1
+    return '\n'.join(lines[i] for i in sorted(chosen))
+
+def _response_usage(response):
+    """
+    Extract (total tokens, model requests) from an agent response's metrics.
+
+    Returns (None, None) for whatever the response doesn't report.
+    """
+    metrics = getattr(response, 'metrics', None) or {}
+    total_tokens = metrics.get('total_tokens')
+    if isinstance(total_tokens, list):
+        return sum(total_tokens), len(total_tokens)
+    if isinstance(total_tokens, int):
+        return total_tokens, None
+    return None, None
+
+async def rate_limited_agent_step(agent, prompt, step_name, use_cache=True):
     """
     Execute an agent step with rate limiting and retries.
     
+    Responses are cached on disk by a hash of the agent name, model id,
+    description and prompt; a hit returns without calling the model at all.
+    
+    Every attempt takes request and token budget from the shared Gemini
+    rate limiter first, so steps run as fast as the quota allows. Rate-limit
+    errors feed back into the limiter, which lowers the shared rate and
+    waits out the server's retry hint before the step is retried. The agent
+    runs on the shared thread pool, at most STAGE_CONCURRENCY calls per stage.
+    
     Args:
         agent: The agent to execute the step
         prompt: The prompt to send to the agent
         step_name: Name of the step for logging
+        use_cache: Set to False to force a fresh response (it is still cached);
+            also bypassed while fresh_responses is set for the run
     """
     logger.info(f"Starting {step_name}")
+    cache_key = response_cache_key(agent, prompt)
+    if use_cache and not fresh_responses.get() and response_cache is not None:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Using cached response for {step_name}")
+            return CachedRunResponse(cached)
+
+    rate_limiter = get_rate_limiter()
+    estimated_tokens = estimate_tokens(agent.description or '') + estimate_tokens(prompt) + OUTPUT_TOKEN_ESTIMATE
     
     async def execute_step():
-        return agent.run(prompt)
+        await cancellable(rate_limiter.acquire(tokens=estimated_tokens))
+        response = await cancellable(run_agent(agent, prompt))
+        actual_tokens, actual_requests = _response_usage(response)
+        rate_limiter.record_usage(estimated_tokens, actual_tokens, actual_requests=actual_requests)
+        record_stage_usage(prompt, response.content)
+        if response_cache is not None and isinstance(response.content, str) and response.content.strip():
+            response_cache.set(cache_key, response.content)
+        return response
     
+    semaphore = _stage_semaphore(agent)
     try:
-        response = await exponential_backoff_retry(execute_step)
-        # Add random delay between 5-15 seconds after successful step
-        delay = random.uniform(5, 15)
-        await asyncio.sleep(delay)
-        return response
+        if semaphore is None:
+            return await call_with_rate_limit(execute_step, rate_limiter)
+        async with semaphore:
+            return await call_with_rate_limit(execute_step, rate_limiter)
     except Exception as e:
         logger.error(f"Error in {step_name}: {str(e)}")
         raise
@@ -96,11 +378,15 @@ manager_agent = Agent(
     """)
 )
 
+# Search results and parsed pages shared across every article's research
+source_store = SourceStore.from_env()
+
 # Researcher Agent - Gathers and analyzes information
 researcher_agent = Agent(
     name="Research Specialist",
     model=gemini_model,
-    tools=[DuckDuckGoTools(), Newspaper4kTools()],
+    tools=[CachedDuckDuckGoTools(source_store), CachedNewspaper4kTools(source_store)]
+    if source_store is not None else [DuckDuckGoTools(), Newspaper4kTools()],
     description=dedent("""
         You are ResearchPro-X, an expert research specialist with capabilities in:
         - Comprehensive information gathering
@@ -176,163 +462,161 @@ content_team = Team(
 )
 
 class ArticleCreationService:
-    def __init__(self, db, team):
+    def __init__(self, db, team, search_index=None, content_index=None):
         self.db = db
         self.team = team
+        self.search_index = search_index
+        self.content_index = content_index
+        self._tag_generator = None
+        self.stage_graph = self._build_stage_graph()
 
-    def get_last_successful_stage(self, versions):
+    def _build_stage_graph(self) -> StageGraph:
         """
-        Determine the last successfully completed stage.
-        
-        Args:
-            versions: List of article versions
-            
-        Returns:
-            Tuple of (last_stage, last_agent, last_content) or (None, None, None) if no stages
+        The article pipeline, declared as stages.
+
+        The four content stages are checkpointed as article versions and
+        required for publication. Extra stages from PIPELINE_EXTRA_STAGES run
+        after editing and are optional: a failure there is logged, not fatal.
         """
         stages = [
-            ('planning', 'manager'),
-            ('research', 'researcher'),
-            ('draft', 'writer'),
-            ('final', 'editor')
+            Stage('planning', 'manager', self._run_planning,
+                  status='researching', current_agent='Editorial Manager'),
+            Stage('research', 'researcher', self._run_research, depends_on=['planning'],
+                  status='researching'),
+            Stage('draft', 'writer', self._run_draft, depends_on=['planning', 'research'],
+                  status='writing'),
+            Stage('final', 'editor', self._run_editing, depends_on=['draft'],
+                  status='editing'),
         ]
-        
-        last_stage = None
-        last_agent = None
-        last_content = None
-        
-        # Sort versions by creation time to get the proper sequence
-        sorted_versions = sorted(versions, key=lambda x: x['created_at'])
-        
-        for version in sorted_versions:
-            stage = version['stage']
-            agent = version['agent']
-            for s, a in stages:
-                if s == stage and a == agent:
-                    last_stage = stage
-                    last_agent = agent
-                    last_content = version['content']
-        
-        return last_stage, last_agent, last_content
+        extra_stages = {
+            'tagging': Stage('tagging', 'tagger', self._run_tagging, depends_on=['final'],
+                             checkpoint=False, required=False),
+            'moderation': Stage('moderation', 'moderator', self._run_moderation, depends_on=['final'],
+                                checkpoint=False, required=False),
+        }
+        for name in EXTRA_STAGES:
+            if name not in extra_stages:
+                raise ValueError(f"Unknown pipeline stage: {name}")
+            stages.append(extra_stages[name])
+        return StageGraph(stages)
+
+    def _index_completed_article(self, article_id: str, content: str) -> None:
+        """Add a newly completed article to the full-text search index, if one is configured"""
+        if self.search_index is None:
+            return
+        try:
+            article = self.db.get_article(article_id)
+            tags = [tag['name'] for tag in self.db.get_article_tags(article_id)]
+            self.search_index.add_document(
+                article_id,
+                article.title,
+                content,
+                tags,
+                article.created_at.isoformat(),
+                article.target_length
+            )
+        except Exception as e:
+            # Search indexing must never fail an otherwise completed article
+            logger.warning(f"Failed to index article {article_id}: {str(e)}")
 
-    async def resume_from_stage(self, article_id: str, prompt: str, target_length: str, research_scope: str,
-                              last_stage: str, last_content: str) -> None:
+    def _check_duplicate_content(self, article_id: str, content: str) -> None:
         """
-        Resume article creation from the last successful stage.
-        
-        Args:
-            article_id: The ID of the article to resume
-            prompt: Original article prompt
-            target_length: Target article length
-            research_scope: Research scope
-            last_stage: Last successfully completed stage
-            last_content: Content from the last successful stage
+        Compare a newly completed article with earlier articles' content, then index it.
+
+        Different prompts can still produce nearly the same article. A match
+        is logged and the article is queued for moderation with a note
+        naming the earlier articles, so an admin decides what to publish.
         """
+        if self.content_index is None:
+            return
         try:
-            logger.info(f"Attempting to resume article {article_id} from stage: {last_stage}")
-            
-            # Map stages to their next agent, status, and prompt creator
-            stages = {
-                'planning': (researcher_agent, 'researching', "researcher", self._create_research_prompt),
-                'research': (writer_agent, 'writing', "writer", self._create_writing_prompt),
-                'draft': (editor_agent, 'editing', "editor", self._create_editing_prompt),
-            }
-            
-            if last_stage not in stages:
-                raise Exception(f"Cannot resume from stage: {last_stage}")
-            
-            next_agent, next_status, next_agent_name, prompt_creator = stages[last_stage]
-            logger.info(f"Next stage: {next_status} with {next_agent_name}")
-            
-            # Update status to show we're resuming
-            try:
-                self.db.update_article_status(article_id, next_status, next_agent_name)
-                logger.info(f"Updated article status to {next_status}")
-            except Exception as e:
-                logger.error(f"Failed to update article status: {str(e)}")
-                raise
-            
-            # Create prompt for next stage using last content
-            try:
-                next_prompt = prompt_creator(prompt, last_content, target_length, research_scope)
-                logger.info(f"Created prompt for {next_agent_name}")
-            except Exception as e:
-                logger.error(f"Failed to create prompt: {str(e)}")
-                raise
-            
-            # Execute next stage
-            try:
-                logger.info(f"Executing {next_agent_name} step")
-                response = await rate_limited_agent_step(next_agent, next_prompt, f"Resuming from {last_stage}")
-                content = response.content
-                logger.info(f"Successfully got response from {next_agent_name}")
-            except Exception as e:
-                logger.error(f"Failed during {next_agent_name} execution: {str(e)}")
-                raise
-            
-            # Update content and continue with remaining stages
-            stage_map = {'planning': 'research', 'research': 'draft', 'draft': 'final'}
-            next_stage = stage_map[last_stage]
-            
-            try:
-                logger.info(f"Saving content for stage: {next_stage}")
-                self.db.update_article_content(
-                    article_id, 
-                    content, 
-                    next_agent_name,  # Use the correct agent name directly
-                    next_stage
-                )
-                logger.info(f"Successfully saved content for {next_stage}")
-            except Exception as e:
-                logger.error(f"Failed to save content: {str(e)}")
-                raise
-            
-            # If we're not at the final stage, continue with the next stage
-            if last_stage != 'draft':
-                logger.info(f"Continuing to next stage: {next_stage}")
-                await self.resume_from_stage(
-                    article_id, 
-                    prompt, 
-                    target_length, 
-                    research_scope, 
-                    next_stage, 
-                    content
-                )
-            else:
-                # We've completed all stages, verify and mark as completed
-                logger.info("Verifying all stages are complete")
-                try:
-                    versions = self.db.get_article_versions(article_id)
-                    required_stages = [
-                        ('planning', 'manager'),
-                        ('research', 'researcher'),
-                        ('draft', 'writer'),
-                        ('final', 'editor')
-                    ]
-                    
-                    # Check each required stage
-                    missing_stages = []
-                    for stage, agent in required_stages:
-                        if not any(v['stage'] == stage and v['agent'] == agent for v in versions):
-                            missing_stages.append(f"{stage} by {agent}")
-                    
-                    if missing_stages:
-                        error_msg = f"Missing stages: {', '.join(missing_stages)}"
-                        logger.error(error_msg)
-                        raise Exception(error_msg)
-                    
-                    logger.info("All stages verified, marking as completed")
-                    self.db.update_article_status(article_id, "completed", None)
-                    
-                except Exception as e:
-                    logger.error(f"Failed during completion verification: {str(e)}")
-                    raise Exception(f"Failed to complete all stages during resume: {str(e)}")
-                    
+            duplicates = self.content_index.find_duplicates(content, exclude=article_id)
+            self.content_index.add_article(article_id, content)
+            if not duplicates:
+                return
+            notes = "Near-duplicate of: " + "; ".join(
+                f"{duplicate['title']} ({duplicate['article_id']}, similarity {duplicate['similarity']})"
+                for duplicate in duplicates
+            )
+            logger.warning(f"Article {article_id} is a near-duplicate of {duplicates[0]['article_id']}")
+            if 'moderation' not in EXTRA_STAGES:
+                self.db.create_moderation_record(article_id, 'pending')
+            self.db.update_moderation_status(article_id, 'pending', moderator_notes=notes)
         except Exception as e:
-            error_msg = f"Resume failed at {last_stage}: {str(e)}"
-            logger.error(error_msg)
-            self.db.update_article_status(article_id, "error", error_msg)
-            raise
+            # Like search indexing, duplicate checks must never fail a completed article
+            logger.warning(f"Failed to check article {article_id} for duplicate content: {str(e)}")
+
+    async def _run_planning(self, state: PipelineState) -> str:
+        plan_prompt = self._create_planning_prompt(state.prompt, state.target_length, state.research_scope)
+        response = await rate_limited_agent_step(manager_agent, plan_prompt, "Planning phase")
+        return response.content
+
+    async def _run_research(self, state: PipelineState) -> str:
+        plan = state.output('planning')
+        content = await self._research_in_parallel(state.prompt, plan, state.target_length, state.research_scope)
+        if content is None:
+            research_prompt = self._create_research_prompt(state.prompt, plan, state.target_length, state.research_scope)
+            response = await rate_limited_agent_step(researcher_agent, research_prompt, "Research phase")
+            content = response.content
+        return content
+
+    async def _run_draft(self, state: PipelineState) -> str:
+        research = state.output('research')
+        compacted = self._compact_stage_input('research', research, state.target_length, state.research_scope)
+        record_uncompacted_tokens(estimate_tokens(
+            self._create_writing_prompt(state.prompt, research, state.target_length, state.research_scope)
+        ))
+        content = None
+        if state.drafting_mode == 'sections':
+            content = await self._draft_in_sections(state, compacted)
+        if content is None:
+            writing_prompt = self._create_writing_prompt(state.prompt, compacted, state.target_length, state.research_scope)
+            response = await rate_limited_agent_step(writer_agent, writing_prompt, "Writing phase")
+            content = response.content
+        return content
+
+    async def _run_editing(self, state: PipelineState) -> str:
+        draft = state.output('draft')
+        compacted = self._compact_stage_input('draft', draft, state.target_length, state.research_scope)
+        record_uncompacted_tokens(estimate_tokens(
+            self._create_editing_prompt(state.prompt, draft, state.target_length, state.research_scope)
+        ))
+        content = None
+        if EDITING_MODE == 'patch':
+            content = await self._edit_with_patches(state.prompt, compacted, state.target_length, state.research_scope)
+        if content is None:
+            editing_prompt = self._create_editing_prompt(state.prompt, compacted, state.target_length, state.research_scope)
+            response = await rate_limited_agent_step(editor_agent, editing_prompt, "Editing phase")
+            content = response.content
+        return content
+
+    async def _run_tagging(self, state: PipelineState) -> None:
+        final = state.output('final')
+        title = next((line.lstrip('#').strip() for line in final.splitlines() if line.startswith('# ')), state.prompt[:100])
+        if self._tag_generator is None:
+            self._tag_generator = TagGenerator()
+        loop = asyncio.get_running_loop()
+        tags = await loop.run_in_executor(_agent_executor, self._tag_generator.generate_tags, title, final)
+        self.db.add_tags_to_article(state.article_id, tags)
+        state.extras['tags'] = tags
+
+    async def _run_moderation(self, state: PipelineState) -> None:
+        self.db.create_moderation_record(state.article_id, 'pending')
+
+    def _compact_stage_input(self, last_stage, last_content, target_length, research_scope):
+        """
+        Shrink a stage's output before it becomes the next stage's input.
+
+        Research is deduplicated and extractively summarized to a budget set
+        by target length and scope. Drafts become the published article, so
+        only paragraphs repeated back to back are collapsed; code, lists and
+        tables are left exactly as written.
+        """
+        if last_stage == 'research':
+            return compact_research(last_content, research_budget(target_length, research_scope))
+        if last_stage == 'draft':
+            return collapse_repeated_paragraphs(last_content)
+        return last_content
 
     def _create_research_prompt(self, prompt, plan, target_length, research_scope):
         return (
@@ -347,6 +631,115 @@ class ArticleCreationService:
             "5. Sources and References"
         )
 
+    async def _research_in_parallel(self, prompt, plan, target_length, research_scope) -> Optional[str]:
+        """
+        Fan research out over the plan's research areas and merge the results.
+
+        The number of concurrent calls comes from RESEARCH_FANOUT for the
+        scope; the research stage semaphore bounds them across articles.
+        Returns None when the scope or plan doesn't warrant a fan-out, so the
+        caller falls back to a single research call.
+        """
+        areas = extract_research_areas(plan, RESEARCH_FANOUT.get(research_scope, 1))
+        if len(areas) < 2:
+            return None
+
+        logger.info(f"Researching {len(areas)} areas in parallel")
+        outcomes = await asyncio.gather(*[
+            rate_limited_agent_step(
+                researcher_agent,
+                self._create_area_research_prompt(prompt, plan, area, research_scope),
+                f"Research area {i + 1} of {len(areas)}"
+            )
+            for i, area in enumerate(areas)
+        ], return_exceptions=True)
+
+        results = []
+        for area, outcome in zip(areas, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"Research failed for area '{area}': {str(outcome)}")
+            else:
+                results.append(parse_research_results(outcome.content or ''))
+        if not results:
+            raise Exception("Research failed for every research area")
+
+        return render_research_results(merge_research_results(results), areas)
+
+    def _create_area_research_prompt(self, prompt, plan, area, research_scope):
+        return (
+            f"Using this content plan:\n{plan}\n\n"
+            f"Research only this area for an article about: {prompt}\n"
+            f"Research area: {area}\n"
+            f"Research scope: {research_scope}\n\n"
+            "Respond with JSON only, in this shape:\n"
+            '{"sources": [{"title": "...", "url": "..."}], '
+            '"key_findings": ["..."], '
+            '"quotes": [{"quote": "...", "speaker": "...", "source": "..."}]}'
+        )
+
+    async def _draft_in_sections(self, state: PipelineState, research: str) -> Optional[str]:
+        """
+        Draft each outline section concurrently, then stitch them together.
+
+        Each section call sees only the research relevant to it. A final
+        short pass writes the title, introduction and conclusion around the
+        sections, rather than regenerating the whole article. Returns None
+        when the plan has no usable outline, so the caller falls back to a
+        single writer call.
+        """
+        prompt, target_length = state.prompt, state.target_length
+        sections = extract_outline_sections(state.output('planning') or '')
+        # Introduction and conclusion come from the stitching pass
+        body = [s for s in sections if not re.match(r'^(?:[IVX]+\.\s*)?(introduction|conclusion)\b', s, re.IGNORECASE)]
+        if len(body) < 2:
+            return None
+
+        words_per_section = TARGET_WORDS.get(target_length, 1000) // (len(body) + 1)
+        logger.info(f"Drafting {len(body)} sections in parallel")
+        responses = await asyncio.gather(*[
+            rate_limited_agent_step(
+                writer_agent,
+                self._create_section_prompt(prompt, body, i, select_relevant_research(research, section), words_per_section),
+                f"Drafting section {i + 1} of {len(body)}"
+            )
+            for i, section in enumerate(body)
+        ])
+        drafted = '\n\n'.join(response.content.strip() for response in responses)
+
+        framing = await rate_limited_agent_step(
+            writer_agent,
+            self._create_stitch_prompt(prompt, drafted, words_per_section),
+            "Stitching sections"
+        )
+        parts = re.split(r'^\s*-{3,}\s*$', framing.content.strip(), maxsplit=1, flags=re.MULTILINE)
+        opening, closing = (parts[0], parts[1]) if len(parts) == 2 else (framing.content, '')
+        return '\n\n'.join(part.strip() for part in (opening, drafted, closing) if part.strip())
+
+    def _create_section_prompt(self, prompt, sections, index, research, words):
+        outline = '\n'.join(f"{i + 1}. {s.splitlines()[0]}" for i, s in enumerate(sections))
+        return (
+            f"You are writing one section of an article about: {prompt}\n\n"
+            f"Article outline:\n{outline}\n\n"
+            f"Write only section {index + 1}:\n{sections[index]}\n\n"
+            f"Relevant research:\n{research}\n\n"
+            f"Guidelines:\n"
+            f"- About {words} words\n"
+            "- Start with a '## ' heading for the section\n"
+            "- No introduction or conclusion for the whole article\n"
+            "- Incorporate research findings and quotes\n"
+            "- Include proper citations"
+        )
+
+    def _create_stitch_prompt(self, prompt, drafted, words):
+        return (
+            f"These sections make up the body of an article about: {prompt}\n\n{drafted}\n\n"
+            "Write only what goes around them:\n"
+            f"1. A '# ' title and an introduction of about {words} words that leads into the first section\n"
+            "2. A line containing only ---\n"
+            f"3. A '## Conclusion' section of about {words} words that ties the sections together\n"
+            "Do not repeat the sections themselves."
+        )
+
     def _create_writing_prompt(self, prompt, research_findings, target_length, research_scope):
         return (
             f"Write an article based on:\n\n"
@@ -360,6 +753,44 @@ class ArticleCreationService:
             "- Include proper citations"
         )
 
+    async def _edit_with_patches(self, prompt, draft, target_length, research_scope) -> Optional[str]:
+        """
+        Have the editor return targeted edits and apply them to the draft locally.
+
+        Only the changed passages are generated, instead of the whole article.
+        Returns None when the edits can't be parsed or applied, so the caller
+        falls back to a full rewrite.
+        """
+        response = await rate_limited_agent_step(
+            editor_agent,
+            self._create_patch_editing_prompt(prompt, draft, target_length, research_scope),
+            "Editing (patch)"
+        )
+        try:
+            edits = parse_edits(response.content or '')
+            edited = apply_edits(draft, edits)
+        except PatchError as e:
+            logger.warning(f"Editor patch did not apply, falling back to a full rewrite: {str(e)}")
+            return None
+        logger.info(f"Applied {len(edits)} editor edits")
+        return edited
+
+    def _create_patch_editing_prompt(self, prompt, draft, target_length, research_scope):
+        return (
+            f"Review and improve this article draft:\n\n{draft}\n\n"
+            "Focus on:\n"
+            "1. Accuracy and fact verification\n"
+            "2. Structure and flow\n"
+            "3. Clarity and readability\n"
+            "4. Grammar and style\n"
+            "5. Citations and references\n\n"
+            "Do not rewrite the article. Respond with JSON only, listing your changes as edits:\n"
+            '{"edits": [{"find": "exact passage from the draft", "replace": "improved passage"}]}\n'
+            "Each 'find' must be copied exactly from the draft and appear in it only once; "
+            "keep passages as short as possible (a sentence or paragraph). "
+            'Return {"edits": []} if the draft needs no changes.'
+        )
+
     def _create_editing_prompt(self, prompt, draft, target_length, research_scope):
         return (
             f"Review and improve this article draft:\n\n{draft}\n\n"
@@ -372,78 +803,107 @@ class ArticleCreationService:
             "Provide the complete improved article. This will be the final published version."
         )
 
-    async def create_article(self, prompt: str, target_length: str, research_scope: str) -> Dict[str, str]:
+    async def resume_article(self, article_id: str, fresh: bool = False) -> Dict[str, str]:
+        """
+        Continue a paused or failed article from its last checkpointed stage.
+
+        The article keeps its ID and versions; only stages without a
+        checkpoint are run. With fresh, those stages ignore cached responses.
+        """
+        article = self.db.get_article(article_id)
+        if not article:
+            raise ValueError(f"Article not found: {article_id}")
+        return await self.create_article(
+            prompt=article.prompt,
+            target_length=article.target_length,
+            research_scope=article.research_scope,
+            article_id=article_id,
+            drafting_mode=article.drafting_mode,
+            fresh=fresh
+        )
+
+    def _create_planning_prompt(self, prompt, target_length, research_scope):
+        return (
+            f"Create a detailed plan for an article about: {prompt}\n"
+            f"Target length: {target_length}\n"
+            f"Research scope: {research_scope}\n\n"
+            "Provide a structured plan including:\n"
+            "1. Key topics to research\n"
+            "2. Specific areas to investigate\n"
+            "3. Types of sources to consult\n"
+            "4. Outline of the final article"
+        )
+
+    async def create_article(self, prompt: str, target_length: str, research_scope: str,
+                             article_id: Optional[str] = None, drafting_mode: str = 'single',
+                             fresh: bool = False) -> Dict[str, str]:
         """
         Creates an article using the team of agents.
         
+        Runs the stage graph; for an existing article, stages already
+        checkpointed in an earlier attempt are skipped.
+        
         Args:
             prompt: The article topic or prompt
             target_length: Desired length ('short', 'medium', 'long')
             research_scope: Research depth ('basic', 'thorough', 'comprehensive')
+            article_id: Existing pending article record to fill in, if already created
+            drafting_mode: 'single' for one writer call, 'sections' to draft outline sections in parallel
+            fresh: Call the model for every stage instead of replaying cached responses
             
         Returns:
             Dict containing article ID and content
         """
-        article_id = None
+        state = None
+        fresh_token = fresh_responses.set(fresh)
         try:
-            # Create article record
-            article_id = self.db.create_article({
-                "title": f"Article about: {prompt[:50]}{'...' if len(prompt) > 50 else ''}",
-                "prompt": prompt,
-                "target_length": target_length,
-                "research_scope": research_scope,
-                "status": "pending"
-            })
-
-            # Planning phase with Editorial Manager
-            self.db.update_article_status(article_id, "researching", "Editorial Manager")
-            plan_prompt = (
-                f"Create a detailed plan for an article about: {prompt}\n"
-                f"Target length: {target_length}\n"
-                f"Research scope: {research_scope}\n\n"
-                "Provide a structured plan including:\n"
-                "1. Key topics to research\n"
-                "2. Specific areas to investigate\n"
-                "3. Types of sources to consult\n"
-                "4. Outline of the final article"
-            )
-            plan_response = await rate_limited_agent_step(manager_agent, plan_prompt, "Planning phase")
-            plan = plan_response.content
-            self.db.update_article_content(article_id, plan, "manager", "planning")
-
-            # Continue with remaining stages by resuming from planning
-            await self.resume_from_stage(article_id, prompt, target_length, research_scope, "planning", plan)
-
-            # Get the final version
-            versions = self.db.get_article_versions(article_id)
-            final_version = next(
-                (v for v in versions if v['stage'] == 'final' and v['agent'] == 'editor'),
-                None
-            )
+            # Create article record unless the caller already did
+            if article_id is None:
+                article_id = self.db.create_article({
+                    "title": f"Article about: {prompt[:50]}{'...' if len(prompt) > 50 else ''}",
+                    "prompt": prompt,
+                    "target_length": target_length,
+                    "research_scope": research_scope,
+                    "drafting_mode": drafting_mode,
+                    "status": "pending"
+                })
+                manifest = []
+            else:
+                manifest = self.db.get_article_manifest(article_id)
+
+            state = PipelineState(self.db, article_id, prompt, target_length, research_scope, drafting_mode, manifest)
+            state.completed = self.stage_graph.completed_from_manifest(manifest)
+            if state.completed:
+                logger.info(f"Resuming article {article_id} after stages: {', '.join(sorted(state.completed))}")
+            await self.stage_graph.run(state)
 
-            if not final_version:
-                raise Exception("Failed to find final version after completion")
+            logger.info("All stages complete, marking as completed")
+            final = state.output('final')
+            self.db.update_article_status(article_id, "completed", None)
+            self._index_completed_article(article_id, final)
+            self._check_duplicate_content(article_id, final)
 
             return {
                 "id": article_id,
-                "content": final_version['content']
+                "content": final
             }
 
         except Exception as e:
+            if is_cancelled():
+                # Paused or deleted: the article's status belongs to whoever cancelled it
+                logger.info(f"Article {article_id} cancelled")
+                raise
             logger.error(f"Error creating article: {str(e)}")
             if article_id:
                 try:
-                    # Get current versions to check progress
-                    versions = self.db.get_article_versions(article_id)
-                    if versions:
-                        # Find the last successful stage
-                        last_stage, last_agent, last_content = self.get_last_successful_stage(versions)
-                        error_msg = f"Failed at stage after {last_stage} by {last_agent}: {str(e)}"
+                    done = [stage.name for stage in self.stage_graph.stages if state and stage.name in state.completed]
+                    if done:
+                        error_msg = f"Failed at stage after {done[-1]}: {str(e)}"
                     else:
                         error_msg = f"Failed before any content was created: {str(e)}"
-                    
                     self.db.update_article_status(article_id, "error", error_msg)
                 except Exception as inner_e:
                     logger.error(f"Error handling failure: {str(inner_e)}")
-                    self.db.update_article_status(article_id, "error", str(e))
-            raise 
\ No newline at end of file
+            raise
+        finally:
+            fresh_responses.reset(fresh_token)
@@ -1,13 +1,18 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, session, make_response, abort
+from werkzeug.exceptions import HTTPException
 from database import Database
 import markdown2
 import os
 from dotenv import load_dotenv
 from datetime import datetime
 import asyncio
-from agent_team import content_team, ArticleCreationService
 from topic_researcher import TopicResearcher
 from tag_generator import TagGenerator
+from cache import RenderCache
+from search_index import SearchIndex
+from duplicate_index import DuplicateIndex
+from scheduling import job_priority
+from batch import ManifestError, articles_from_rows, batch_progress, manifest_format, parse_manifest, submit_batch
 import logging
 import hashlib
 import uuid
@@ -29,10 +34,20 @@ app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev')  # Set a secret key for fl
 
 # Initialize database and services
 db = Database(url=SUPABASE_URL, key=SUPABASE_KEY)
-article_service = ArticleCreationService(db, content_team)
+search_index = SearchIndex(os.getenv('SEARCH_INDEX_PATH', 'data/search_index.json.gz'))
+duplicate_index = DuplicateIndex(db, threshold=float(os.getenv('DUPLICATE_THRESHOLD', '0.7')))
+# What to do when a submitted prompt nearly matches an existing one: off, warn, block or redirect
+DUPLICATE_POLICY = os.getenv('DUPLICATE_POLICY', 'warn')
 topic_researcher = TopicResearcher(db)
 tag_generator = TagGenerator()
 
+# Rendered article HTML, keyed by final version id (disk tier is optional)
+render_cache = RenderCache(
+    max_entries=int(os.getenv('RENDER_CACHE_ENTRIES', '128')),
+    max_bytes=int(os.getenv('RENDER_CACHE_MAX_BYTES', str(32 * 1024 * 1024))),
+    disk_dir=os.getenv('RENDER_CACHE_DIR') or None
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -58,17 +73,192 @@ def format_article_dates(article):
         article['updated_at'] = datetime.fromisoformat(article['updated_at'].replace('Z', '+00:00'))
     return article
 
-async def process_article(article_data):
-    """Process a single article using the article service"""
+def parse_timestamp(value):
+    """Parse a Supabase ISO timestamp (or pass through a datetime)"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return value
+
+def make_etag(*parts):
+    """Build an ETag value from the pieces of state a page depends on"""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+def not_modified(etag, last_modified=None):
+    """
+    Return a 304 response if the client's cached copy is still current, else None.
+
+    Called before the expensive queries so unchanged pages skip them entirely.
+    Pages with pending flash messages are always rendered so the message shows.
+    """
+    if session.get('_flashes'):
+        return None
+    
+    if request.if_none_match:
+        # If-None-Match takes precedence over If-Modified-Since
+        is_current = request.if_none_match.contains_weak(etag)
+    elif last_modified and request.if_modified_since:
+        is_current = last_modified.replace(microsecond=0) <= request.if_modified_since
+    else:
+        is_current = False
+    
+    if not is_current:
+        return None
+    return with_validators(app.response_class(status=304), etag, last_modified)
+
+def with_validators(response, etag, last_modified=None):
+    """Attach ETag / Last-Modified headers and require revalidation"""
+    response = make_response(response)
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
+# Ranked search pages by offset; its cursors carry this prefix so they can't
+# be mistaken for the base64 keyset cursors used everywhere else
+RANKED_CURSOR_PREFIX = 'rank:'
+
+def is_ranked_cursor(cursor):
+    return bool(cursor) and cursor.startswith(RANKED_CURSOR_PREFIX)
+
+def get_page_args(allow_ranked=False):
+    """
+    Get the (page size, cursor) pagination arguments from the query string.
+
+    A malformed or stale cursor aborts the request with 400.
+    """
+    per_page = db.clamp_page_size(request.args.get('per_page', type=int))
+    cursor = request.args.get('cursor') or None
+    if cursor:
+        if is_ranked_cursor(cursor):
+            if not allow_ranked or not cursor[len(RANKED_CURSOR_PREFIX):].isdigit():
+                abort(400, description=f"Invalid page cursor: {cursor}")
+        else:
+            try:
+                db.decode_cursor(cursor)
+            except ValueError as e:
+                abort(400, description=str(e))
+    return per_page, cursor
+
+def page_url(cursor=None):
+    """Build a URL for another page of the current listing, keeping its filters"""
+    args = request.args.to_dict(flat=False)
+    args.pop('cursor', None)
+    if cursor:
+        args['cursor'] = cursor
+    return url_for(request.endpoint, **args)
+
+def enqueue_article(article_data, origin='manual', fresh=False):
+    """
+    Create the pending article record and queue it for the generation worker.
+
+    With fresh, the worker calls the model for every stage instead of
+    replaying responses cached for an identical prompt.
+
+    The origin ('manual' or 'trending') is stored on the article and picks
+    the job's scheduling class, weight and default deadline. If the job
+    can't be queued the article is removed again, as for batches.
+
+    Returns:
+        Tuple of (article ID, job ID)
+    """
+    article_id = db.create_article({**article_data, 'origin': origin})
     try:
-        await article_service.create_article(
-            prompt=article_data['prompt'],
-            target_length=article_data['target_length'],
-            research_scope=article_data['research_scope']
+        job_id = db.enqueue_job(
+            {
+                'prompt': article_data['prompt'],
+                'target_length': article_data['target_length'],
+                'research_scope': article_data['research_scope'],
+                'drafting_mode': article_data.get('drafting_mode', 'single'),
+                'fresh': fresh
+            },
+            article_id=article_id,
+            priority=job_priority(origin, article_data['target_length'])
         )
-    except Exception as e:
-        app.logger.error(f"Error processing article: {str(e)}")
+    except Exception:
+        # A pending article without a job would never run and can't be resumed
+        try:
+            db.client.table('articles').delete().eq('id', article_id).execute()
+        except Exception as e:
+            app.logger.error(f"Failed to remove article {article_id} after enqueue failure: {str(e)}")
+            db.update_article_status(article_id, 'error')
         raise
+    # Indexed only once queued, so a failed enqueue can't leave a phantom duplicate
+    try:
+        duplicate_index.add_article(article_id, article_data['prompt'])
+    except Exception as e:
+        # Duplicate detection must never fail a submission
+        app.logger.warning(f"Failed to index prompt of article {article_id}: {str(e)}")
+    return article_id, job_id
+
+def find_duplicate_prompts(prompt):
+    """Near-duplicate earlier prompts, each with a link to its article"""
+    if DUPLICATE_POLICY == 'off':
+        return []
+    try:
+        duplicates = duplicate_index.find_duplicates(prompt)
+    except Exception as e:
+        app.logger.warning(f"Duplicate check failed: {str(e)}")
+        return []
+    for duplicate in duplicates:
+        duplicate['url'] = url_for('article', article_id=duplicate['article_id'])
+    return duplicates
+
+def duplicate_rejection(duplicates):
+    """
+    Response refusing a near-duplicate submission, or None to go ahead.
+
+    Under the 'block' and 'redirect' policies a duplicate is refused with
+    409 unless the form sets allow_duplicate; 'redirect' also points the
+    client at the closest existing article. 'warn' never refuses.
+    """
+    if not duplicates or DUPLICATE_POLICY not in ('block', 'redirect') or request.form.get('allow_duplicate'):
+        return None
+    body = {
+        'success': False,
+        'error': f"A nearly identical prompt was already submitted: {duplicates[0]['title']}",
+        'duplicates': duplicates
+    }
+    if DUPLICATE_POLICY == 'redirect':
+        body['redirect'] = duplicates[0]['url']
+    return jsonify(body), 409
+
+def sync_search_index():
+    """
+    Catch the local search index up with articles completed by the workers.
+
+    The worker service has its own disk, so its index updates never reach
+    this process; instead the index is synced from the database whenever the
+    published feed changes (checked at most every SEARCH_INDEX_SYNC_INTERVAL
+    seconds). Only the changed articles are fetched here; an empty index,
+    e.g. after a deploy, is rebuilt in a background thread while search
+    falls back to the database.
+    """
+    try:
+        search_index.sync(db, min_interval=float(os.getenv('SEARCH_INDEX_SYNC_INTERVAL', '60')))
+    except Exception as e:
+        app.logger.warning(f"Failed to sync search index: {str(e)}")
+
+def ranked_search(query, tags, tag_mode, date_from, date_to, target_length, per_page, cursor):
+    """
+    Get one page of BM25-ranked results from the local search index.
+
+    Ranked results are paged by offset, so the cursor here is 'rank:' plus
+    the offset of the next page. A keyset cursor (from before the index
+    was built) starts again from the first page.
+    """
+    offset = int(cursor[len(RANKED_CURSOR_PREFIX):]) if is_ranked_cursor(cursor) else 0
+    ranked = search_index.search(
+        query,
+        tags=tags,
+        date_from=date_from,
+        date_to=date_to,
+        target_length=target_length,
+        tag_mode=tag_mode
+    )
+    page_ids = [article_id for article_id, _ in ranked[offset:offset + per_page]]
+    next_cursor = f"{RANKED_CURSOR_PREFIX}{offset + per_page}" if offset + per_page < len(ranked) else None
+    return db.get_articles_by_ids(page_ids), next_cursor
 
 # ===== SEARCH ROUTES =====
 
@@ -78,39 +268,52 @@ def search():
     try:
         query = request.args.get('q', '').strip()
         tags = request.args.getlist('tags')
+        tag_mode = 'all' if request.args.get('tag_mode') == 'all' else 'any'
         date_from = request.args.get('date_from')
         date_to = request.args.get('date_to')
         target_length = request.args.get('target_length')
+        per_page, cursor = get_page_args(allow_ranked=True)
         
-        # Search articles
-        articles = db.search_articles(
-            query=query,
-            tags=tags if tags else None,
-            date_from=date_from,
-            date_to=date_to,
-            target_length=target_length
-        )
-        
-        # Format dates and add tags for each article
-        formatted_articles = []
-        for article in articles:
-            article = format_article_dates(article)
-            article['tags'] = db.get_article_tags(article['id'])
-            formatted_articles.append(article)
-        
-        # Get suggested tags if there's a query
-        suggested_tags = []
+        # Search articles (tags are embedded in the results). Text queries are
+        # ranked by the local full-text index once it has been built.
         if query:
-            suggested_tags = tag_generator.suggest_tags_for_search(query)
+            sync_search_index()
+        if query and len(search_index):
+            articles, next_cursor = ranked_search(
+                query, tags, tag_mode, date_from, date_to, target_length, per_page, cursor
+            )
+        else:
+            if is_ranked_cursor(cursor):
+                # The ranked index is unavailable now; start over with keyset pages
+                cursor = None
+            articles, next_cursor = db.search_articles(
+                query=query,
+                tags=tags if tags else None,
+                date_from=date_from,
+                date_to=date_to,
+                target_length=target_length,
+                limit=per_page,
+                cursor=cursor,
+                tag_mode=tag_mode
+            )
+        
+        # Format dates for each article
+        formatted_articles = [format_article_dates(article) for article in articles]
         
+        # Suggested tags are loaded afterwards from /api/suggested-tags so the
+        # page never waits on the model
         return render_template('search.html', 
                              articles=formatted_articles,
                              query=query,
                              tags=tags,
+                             tag_mode=tag_mode,
                              date_from=date_from,
                              date_to=date_to,
                              target_length=target_length,
-                             suggested_tags=suggested_tags)
+                             next_page_url=page_url(next_cursor) if next_cursor else None,
+                             first_page_url=page_url() if cursor else None)
+    except HTTPException:
+        raise
     except Exception as e:
         app.logger.error(f"Error in search route: {str(e)}")
         flash(f"Error searching articles: {str(e)}", 'danger')
@@ -124,20 +327,36 @@ def search_suggestions():
         if not query or len(query) < 2:
             return jsonify([])
         
-        # Get articles that match the query for autocomplete
-        articles = db.search_articles(query=query)
         suggestions = []
         
-        # Extract unique titles and add to suggestions
-        for article in articles[:10]:  # Limit to 10 suggestions
-            if article['title'] not in suggestions:
-                suggestions.append(article['title'])
+        # Complete titles and tag names from the in-memory prefix index (limit to 10 suggestions)
+        sync_search_index()
+        if len(search_index):
+            suggestions = search_index.suggest(query, limit=10)
+        else:
+            articles, _ = db.search_articles(query=query, limit=10)
+            for article in articles:
+                if article['title'] not in suggestions:
+                    suggestions.append(article['title'])
         
         return jsonify(suggestions)
     except Exception as e:
         app.logger.error(f"Error getting search suggestions: {str(e)}")
         return jsonify([])
 
+@app.route('/api/suggested-tags')
+def suggested_tags():
+    """Get AI tag suggestions for a search query (memoized per normalized query)"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify([])
+        
+        return jsonify(tag_generator.suggest_tags_for_search(query))
+    except Exception as e:
+        app.logger.error(f"Error getting suggested tags: {str(e)}")
+        return jsonify([])
+
 # ===== ANALYTICS ROUTES =====
 
 @app.route('/api/track-view', methods=['POST'])
@@ -287,44 +506,84 @@ def moderate_article(article_id):
         app.logger.error(f"Error moderating article: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/admin/batches', methods=['POST'])
+def create_batch():
+    """
+    Queue a batch of articles from a manifest.
+
+    Accepts a .jsonl or .csv file upload in the 'manifest' field, or a
+    JSON body of the form {"name": ..., "articles": [{"prompt": ...}, ...]}.
+    """
+    if not session.get('admin_authenticated'):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        upload = request.files.get('manifest')
+        if upload:
+            name = request.form.get('name') or upload.filename
+            articles = parse_manifest(upload.read().decode('utf-8'), manifest_format(upload.filename))
+        else:
+            data = request.get_json(silent=True) or {}
+            if not isinstance(data.get('articles'), list):
+                return jsonify({'error': "Upload a manifest file or send a JSON 'articles' list"}), 400
+            name = data.get('name')
+            articles = articles_from_rows(enumerate(data['articles'], 1))
+
+        batch_id, article_ids = submit_batch(db, articles, name, duplicate_index=duplicate_index)
+        return jsonify({
+            'success': True,
+            'batch_id': batch_id,
+            'article_ids': article_ids,
+            'progress_url': url_for('batch_status', batch_id=batch_id)
+        })
+    except (ManifestError, UnicodeDecodeError) as e:
+        return jsonify({'error': f"Invalid manifest: {str(e)}"}), 400
+    except Exception as e:
+        app.logger.error(f"Error creating batch: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/batches/<batch_id>')
+def batch_status(batch_id):
+    """Get progress and throughput of a batch"""
+    if not session.get('admin_authenticated'):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        progress = batch_progress(db, batch_id)
+        if progress is None:
+            return jsonify({'error': 'Batch not found'}), 404
+        return jsonify(progress)
+    except Exception as e:
+        app.logger.error(f"Error getting batch progress: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 # ===== EXISTING ROUTES (UPDATED) =====
 
 @app.route('/')
 def index():
     """Show list of all completed articles"""
     try:
-        # Get all completed articles from Supabase
-        response = db.client.table('articles')\
-            .select('*')\
-            .eq('status', 'completed')\
-            .order('created_at', desc=True)\
-            .execute()
-        
-        # Format dates and add tags for each article
-        articles = []
-        for article_data in response.data:
-            # Get all versions for this article
-            versions = db.get_article_versions(article_data['id'])
-            
-            # Validate article has gone through all required stages
-            has_all_stages = all(
-                any(v['stage'] == stage and v['agent'] == agent 
-                    for v in versions)
-                for stage, agent in [
-                    ('planning', 'manager'),
-                    ('research', 'researcher'),
-                    ('draft', 'writer'),
-                    ('final', 'editor')
-                ]
-            )
-            
-            # Only include properly completed articles
-            if has_all_stages:
-                article_data = format_article_dates(article_data)
-                article_data['tags'] = db.get_article_tags(article_data['id'])
-                articles.append(article_data)
+        per_page, cursor = get_page_args()
+        
+        # Answer from the client's cache if the feed hasn't changed
+        article_count, last_updated = db.get_published_feed_state()
+        last_modified = parse_timestamp(last_updated)
+        etag = make_etag('index', article_count, last_updated, per_page, cursor)
+        cached = not_modified(etag, last_modified)
+        if cached:
+            return cached
+        
+        # Get one page of the published feed (completed, all stages present, tags embedded)
+        articles, next_cursor = db.get_published_articles(limit=per_page, cursor=cursor)
+        articles = [format_article_dates(article) for article in articles]
                 
-        return render_template('index.html', articles=articles)
+        return with_validators(render_template('index.html',
+                             articles=articles,
+                             next_page_url=page_url(next_cursor) if next_cursor else None,
+                             first_page_url=page_url() if cursor else None),
+                             etag, last_modified)
+    except HTTPException:
+        raise
     except Exception as e:
         app.logger.error(f"Error in index route: {str(e)}")
         return f"Error loading articles: {str(e)}", 500
@@ -333,7 +592,21 @@ def index():
 def article(article_id):
     """Show a specific article"""
     try:
-        # Track article view
+        # Get article details
+        article = db.get_article(article_id)
+        if not article:
+            return "Article not found", 404
+
+        # Answer from the client's cache if the published article hasn't changed
+        etag = None
+        if article.has_all_stages and article.final_version_id:
+            etag = make_etag('article', article.id, article.updated_at.isoformat(), article.final_version_id)
+            cached = not_modified(etag, article.updated_at)
+            if cached:
+                return cached
+
+        # Track article view; revalidations (304s above) don't count, so they
+        # cost the one article lookup and nothing more
         db.track_article_view(
             article_id=article_id,
             session_id=get_session_id(),
@@ -341,43 +614,21 @@ def article(article_id):
             user_agent=request.headers.get('User-Agent'),
             referrer=request.referrer
         )
-        
-        # Get article details
-        article = db.get_article(article_id)
-        if not article:
-            return "Article not found", 404
 
-        # Get all versions
-        versions = db.get_article_versions(article_id)
-        if not versions:
-            return "No content found", 404
+        # Locate the final version without pulling any version content
+        if article.has_all_stages and article.final_version_id:
+            final_version_id = article.final_version_id
+        else:
+            manifest = db.get_article_manifest(article_id)
+            if not manifest:
+                return "No content found", 404
             
-        # Validate article has gone through all required stages
-        has_all_stages = all(
-            any(v['stage'] == stage and v['agent'] == agent 
-                for v in versions)
-            for stage, agent in [
-                ('planning', 'manager'),
-                ('research', 'researcher'),
-                ('draft', 'writer'),
-                ('final', 'editor')
-            ]
-        )
-        
-        if not has_all_stages:
-            flash('This article is not yet ready for viewing', 'warning')
-            return redirect(url_for('index'))
-        
-        # Find the final version from the editor
-        final_version = None
-        for version in versions:
-            if version['stage'] == 'final' and version['agent'] == 'editor':
-                final_version = version
-                break
-                
-        if not final_version:
-            flash('Final version not found', 'warning')
-            return redirect(url_for('index'))
+            # Validate article has gone through all required stages
+            if db.get_missing_stages(manifest):
+                flash('This article is not yet ready for viewing', 'warning')
+                return redirect(url_for('index'))
+            
+            final_version_id = db.find_latest_version(manifest, 'final', 'editor')['id']
         
         # Format article dates
         article_data = {
@@ -398,12 +649,22 @@ def article(article_id):
         # Get article analytics
         article_data['analytics'] = db.get_article_analytics(article_id)
         
-        # Convert markdown content to HTML
-        html_content = markdown2.markdown(final_version['content'])
+        # Convert markdown content to HTML (cached per final version, so the
+        # content is only fetched on a cache miss)
+        def render_final_version():
+            final_version = db.get_article_version(final_version_id)
+            if not final_version:
+                raise Exception("Final version not found")
+            return markdown2.markdown(final_version['content'])
+        
+        html_content = render_cache.get_or_render(article_id, final_version_id, render_final_version)
         
-        return render_template('article.html', 
+        response = render_template('article.html', 
                              article=article_data, 
                              content=html_content)
+        if etag:
+            response = with_validators(response, etag, article.updated_at)
+        return response
     except Exception as e:
         app.logger.error(f"Error in article route: {str(e)}")
         return f"Error loading article: {str(e)}", 500
@@ -412,15 +673,19 @@ def article(article_id):
 def prompts():
     """Show list of all prompts"""
     try:
-        # Get all articles (prompts) ordered by creation date
-        response = db.client.table('articles')\
-            .select('*')\
-            .order('created_at', desc=True)\
-            .execute()
+        per_page, cursor = get_page_args()
+        
+        # Get one page of articles (prompts) ordered by creation date
+        prompts, next_cursor = db.list_articles(limit=per_page, cursor=cursor)
         
         # Format dates for each prompt
-        prompts = [format_article_dates(prompt) for prompt in response.data]
-        return render_template('prompts.html', prompts=prompts)
+        prompts = [format_article_dates(prompt) for prompt in prompts]
+        return render_template('prompts.html',
+                             prompts=prompts,
+                             next_page_url=page_url(next_cursor) if next_cursor else None,
+                             first_page_url=page_url() if cursor else None)
+    except HTTPException:
+        raise
     except Exception as e:
         app.logger.error(f"Error in prompts route: {str(e)}")
         flash(f"Error loading prompts: {str(e)}", 'danger')
@@ -437,13 +702,22 @@ def submit_prompt():
                 'prompt': request.form['prompt'],
                 'research_scope': request.form['research_scope'],
                 'target_length': request.form['target_length'],
+                'drafting_mode': request.form.get('drafting_mode', 'single'),
                 'status': 'pending'
             }
+            if article_data['drafting_mode'] not in db.DRAFTING_MODES:
+                return jsonify({'success': False, 'error': 'Invalid drafting mode'}), 400
+            
+            # Don't spend a full pipeline run on a prompt we've already generated
+            duplicates = find_duplicate_prompts(article_data['prompt'])
+            rejection = duplicate_rejection(duplicates)
+            if rejection:
+                return rejection
             
-            # Start processing the article asynchronously
-            asyncio.run(process_article(article_data))
+            # Queue the article for the generation worker
+            article_id, job_id = enqueue_article(article_data, fresh=bool(request.form.get('fresh')))
             
-            return jsonify({'success': True})
+            return jsonify({'success': True, 'article_id': article_id, 'job_id': job_id, 'duplicates': duplicates})
         except Exception as e:
             app.logger.error(f"Error submitting prompt: {str(e)}")
             return jsonify({'success': False, 'error': str(e)}), 500
@@ -455,6 +729,8 @@ def pause_prompt(prompt_id):
     """Pause article generation"""
     try:
         db.update_article_status(prompt_id, 'paused')
+        # Stop queued work and signal the worker running this article, if any
+        db.cancel_article_jobs(prompt_id)
         flash('Prompt paused successfully!', 'success')
     except Exception as e:
         app.logger.error(f"Error pausing prompt: {str(e)}")
@@ -463,7 +739,7 @@ def pause_prompt(prompt_id):
 
 @app.route('/prompt/<prompt_id>/resume', methods=['POST'])
 def resume_prompt(prompt_id):
-    """Resume article generation"""
+    """Resume article generation from its last checkpointed stage"""
     try:
         # Get the article data
         article = db.get_article(prompt_id)
@@ -471,20 +747,27 @@ def resume_prompt(prompt_id):
             flash('Article not found', 'danger')
             return redirect(url_for('prompts'))
             
+        if article.status not in ('paused', 'error'):
+            flash('Only paused or failed prompts can be resumed', 'warning')
+            return redirect(url_for('prompts'))
+        active_job = db.get_active_job(prompt_id)
+        if active_job and active_job.get('cancel_requested'):
+            flash('Prompt is still stopping; try resuming again in a few seconds', 'info')
+            return redirect(url_for('prompts'))
+        if active_job:
+            flash('Prompt is already queued for processing', 'info')
+            return redirect(url_for('prompts'))
+            
         # Update status to pending
         db.update_article_status(prompt_id, 'pending')
         
-        # Start processing the article asynchronously
-        article_data = {
-            'title': article.title,
-            'prompt': article.prompt,
-            'research_scope': article.research_scope,
-            'target_length': article.target_length,
-            'status': 'pending'
-        }
-        asyncio.run(process_article(article_data))
+        # Queue the existing article; the worker continues from its last checkpointed stage
+        # "Resume fresh" regenerates the remaining stages instead of replaying cached responses
+        # It keeps its origin's scheduling class, so a resumed batch article doesn't jump the queue
+        db.enqueue_job({'fresh': bool(request.form.get('fresh'))}, article_id=prompt_id, kind='resume_article',
+                       priority=job_priority(article.origin, article.target_length))
         
-        flash('Prompt resumed successfully and processing has started!', 'success')
+        flash('Prompt resumed successfully and queued for processing!', 'success')
     except Exception as e:
         app.logger.error(f"Error resuming prompt: {str(e)}")
         flash(f"Error resuming prompt: {str(e)}", 'danger')
@@ -496,17 +779,50 @@ def delete_prompt(prompt_id):
     try:
         # Delete the article and its versions (cascade delete is handled by the database)
         db.client.table('articles').delete().eq('id', prompt_id).execute()
+        render_cache.invalidate(prompt_id)
+        search_index.remove_document(prompt_id)
         flash('Prompt deleted successfully!', 'success')
     except Exception as e:
         app.logger.error(f"Error deleting prompt: {str(e)}")
         flash(f"Error deleting prompt: {str(e)}", 'danger')
     return redirect(url_for('prompts'))
 
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Get the status of a generation job"""
+    try:
+        job = db.get_job(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify({
+            'id': job['id'],
+            'article_id': job['article_id'],
+            'status': job['status'],
+            'attempts': job['attempts'],
+            'max_attempts': job['max_attempts'],
+            'last_error': job['last_error'],
+            'created_at': job['created_at'],
+            'started_at': job['started_at'],
+            'finished_at': job['finished_at']
+        })
+    except Exception as e:
+        app.logger.error(f"Error getting job status: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 # Trending Topics Routes
 @app.route('/trending-topics')
 def trending_topics():
     """Show trending topics page"""
     try:
+        # Answer from the client's cache if the active topics haven't changed
+        topic_count, last_updated = db.get_trending_topics_state()
+        last_modified = parse_timestamp(last_updated)
+        etag = make_etag('trending-topics', topic_count, last_updated)
+        cached = not_modified(etag, last_modified)
+        if cached:
+            return cached
+        
         # Get active trending topics
         response = db.client.table('trending_topics')\
             .select('*')\
@@ -515,7 +831,7 @@ def trending_topics():
             .execute()
         
         topics = [format_article_dates(topic) for topic in response.data]
-        return render_template('trending_topics.html', topics=topics)
+        return with_validators(render_template('trending_topics.html', topics=topics), etag, last_modified)
     except Exception as e:
         app.logger.error(f"Error loading trending topics: {str(e)}")
         flash(f"Error loading trending topics: {str(e)}", 'danger')
@@ -539,6 +855,9 @@ def create_article_from_topic():
         topic_id = request.form.get('topic_id')
         if not topic_id:
             return jsonify({'success': False, 'error': 'No topic ID provided'}), 400
+        drafting_mode = request.form.get('drafting_mode', 'single')
+        if drafting_mode not in db.DRAFTING_MODES:
+            return jsonify({'success': False, 'error': 'Invalid drafting mode'}), 400
             
         # Get topic details
         response = db.client.table('trending_topics')\
@@ -558,11 +877,17 @@ def create_article_from_topic():
             'prompt': f"{topic['title']}\n\n{topic['description']}",
             'research_scope': request.form.get('research_scope', 'thorough'),
             'target_length': request.form.get('target_length', 'medium'),
+            'drafting_mode': drafting_mode,
             'status': 'pending'
         }
         
-        # Start processing the article
-        asyncio.run(process_article(article_data))
+        duplicates = find_duplicate_prompts(article_data['prompt'])
+        rejection = duplicate_rejection(duplicates)
+        if rejection:
+            return rejection
+        
+        # Queue the article for the generation worker; trending topics are time-sensitive
+        article_id, job_id = enqueue_article(article_data, origin='trending', fresh=bool(request.form.get('fresh')))
         
         # Update topic status
         db.client.table('trending_topics')\
@@ -570,7 +895,7 @@ def create_article_from_topic():
             .eq('id', topic_id)\
             .execute()
         
-        return jsonify({'success': True})
+        return jsonify({'success': True, 'article_id': article_id, 'job_id': job_id, 'duplicates': duplicates})
     except Exception as e:
         app.logger.error(f"Error creating article from topic: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
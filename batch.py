@@ -0,0 +1,280 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from database import Database
+from duplicate_index import DuplicateIndex
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+TARGET_LENGTHS = {'short', 'medium', 'long'}
+RESEARCH_SCOPES = {'basic', 'thorough', 'comprehensive'}
+FINISHED_STATUSES = {'succeeded', 'failed', 'cancelled'}
+
+class ManifestError(ValueError):
+    """Raised when a batch manifest can't be parsed or has invalid rows"""
+
+def manifest_format(filename: str) -> str:
+    """'jsonl' or 'csv', from a manifest's file extension"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    if extension == '.csv':
+        return 'csv'
+    raise ManifestError(f"Unsupported manifest type {extension or filename!r}; use .jsonl or .csv")
+
+def _default_title(prompt: str, max_chars: int = 100) -> str:
+    title = ' '.join(prompt.split())
+    if len(title) <= max_chars:
+        return title
+    return title[:max_chars].rsplit(' ', 1)[0] + '...'
+
+def _article_from_row(row: Dict, line: int) -> Dict:
+    """Validate one manifest row and turn it into a pending article record"""
+    if not isinstance(row, dict):
+        raise ManifestError(f"Line {line}: expected an object, got {type(row).__name__}")
+    prompt = (row.get('prompt') or '').strip()
+    if not prompt:
+        raise ManifestError(f"Line {line}: missing prompt")
+
+    article = {
+        'title': (row.get('title') or '').strip() or _default_title(prompt),
+        'prompt': prompt,
+        'target_length': (row.get('target_length') or 'medium').strip(),
+        'research_scope': (row.get('research_scope') or 'thorough').strip(),
+        'drafting_mode': (row.get('drafting_mode') or 'single').strip(),
+        'status': 'pending'
+    }
+    if article['target_length'] not in TARGET_LENGTHS:
+        raise ManifestError(f"Line {line}: invalid target_length {article['target_length']!r}")
+    if article['research_scope'] not in RESEARCH_SCOPES:
+        raise ManifestError(f"Line {line}: invalid research_scope {article['research_scope']!r}")
+    if article['drafting_mode'] not in Database.DRAFTING_MODES:
+        raise ManifestError(f"Line {line}: invalid drafting_mode {article['drafting_mode']!r}")
+    return article
+
+def parse_manifest(text: str, fmt: str) -> List[Dict]:
+    """
+    Parse a batch manifest into pending article records.
+
+    JSONL manifests have one object per line; CSV manifests have a header
+    row. Each row needs a prompt and may set title, target_length
+    (default medium), research_scope (default thorough) and drafting_mode
+    (default single). The whole manifest is validated before anything is
+    queued, so a typo on line 300 doesn't leave half a batch behind.
+    """
+    if fmt == 'jsonl':
+        rows = []
+        for line, raw in enumerate(text.splitlines(), 1):
+            if not raw.strip():
+                continue
+            try:
+                rows.append((line, json.loads(raw)))
+            except ValueError as e:
+                raise ManifestError(f"Line {line}: invalid JSON: {str(e)}")
+    elif fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames or 'prompt' not in reader.fieldnames:
+            raise ManifestError("CSV manifest needs a header row with a 'prompt' column")
+        # Line numbers count the header, as a spreadsheet would show them
+        rows = [(line, row) for line, row in enumerate(reader, 2)]
+    else:
+        raise ManifestError(f"Unsupported manifest format {fmt!r}")
+
+    return articles_from_rows(rows)
+
+def articles_from_rows(rows) -> List[Dict]:
+    """Validate (line number, row) pairs into pending article records"""
+    articles = [_article_from_row(row, line) for line, row in rows]
+    if not articles:
+        raise ManifestError("Manifest has no prompts")
+    return articles
+
+def submit_batch(db: Database, articles: List[Dict], name: Optional[str] = None,
+                 duplicate_index=None) -> Tuple[str, List[str]]:
+    """
+    Create a batch and queue its articles for the generation workers.
+
+    The workers bound how many articles generate at once (WORKER_CONCURRENCY
+    per worker) and share one Gemini rate-limit budget, so a large batch
+    queues up behind that budget instead of tripping 429s. The prompts are
+    added to the duplicate index, if given, so later submissions see them.
+
+    Returns:
+        Tuple of (batch ID, article IDs)
+    """
+    batch_id = db.create_batch(name, len(articles))
+    article_ids = db.enqueue_batch_articles(batch_id, articles)
+    if duplicate_index is not None:
+        try:
+            duplicate_index.add_articles([
+                (article_id, article['prompt'])
+                for article_id, article in zip(article_ids, articles)
+            ])
+        except Exception as e:
+            logger.warning(f"Failed to index prompts of batch {batch_id}: {str(e)}")
+    logger.info(f"Queued batch {batch_id} with {len(article_ids)} articles")
+    return batch_id, article_ids
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def batch_progress(db: Database, batch_id: str) -> Optional[Dict]:
+    """
+    Summarize a batch: job counts by status, throughput and an ETA.
+
+    Throughput is finished articles per minute since the first job of the
+    batch started, and the ETA extrapolates it over the jobs still
+    queued or running. Returns None for an unknown batch.
+    """
+    batch = db.get_batch(batch_id)
+    if not batch:
+        return None
+    jobs = db.get_batch_jobs(batch_id)
+
+    counts = {'queued': 0, 'running': 0, 'succeeded': 0, 'failed': 0, 'cancelled': 0}
+    for job in jobs:
+        counts[job['status']] = counts.get(job['status'], 0) + 1
+    finished = sum(counts[status] for status in FINISHED_STATUSES)
+    remaining = len(jobs) - finished
+
+    started = [ts for ts in (_parse_timestamp(job.get('started_at')) for job in jobs) if ts]
+    finished_at = [ts for ts in (_parse_timestamp(job.get('finished_at')) for job in jobs) if ts]
+    elapsed_seconds = None
+    throughput = None
+    eta_seconds = None
+    if started:
+        end = max(finished_at) if finished_at and not remaining else datetime.now(timezone.utc)
+        elapsed_seconds = max((end - min(started)).total_seconds(), 0.0)
+        if elapsed_seconds > 0 and finished:
+            throughput = finished / (elapsed_seconds / 60)
+            if remaining:
+                eta_seconds = remaining / throughput * 60
+
+    return {
+        'id': batch['id'],
+        'name': batch.get('name'),
+        'created_at': batch.get('created_at'),
+        'total': batch.get('total', len(jobs)),
+        'counts': counts,
+        'finished': finished,
+        'remaining': remaining,
+        'done': remaining == 0,
+        'percent': round(100 * finished / len(jobs), 1) if jobs else 0.0,
+        'elapsed_seconds': elapsed_seconds,
+        'articles_per_minute': round(throughput, 2) if throughput else None,
+        'eta_seconds': round(eta_seconds) if eta_seconds is not None else None,
+        'errors': [
+            {'article_id': job['article_id'], 'error': job['last_error']}
+            for job in jobs if job['status'] == 'failed' and job.get('last_error')
+        ]
+    }
+
+def format_progress(progress: Dict) -> str:
+    """One-line progress summary for the CLI"""
+    counts = progress['counts']
+    line = (f"{progress['finished']}/{progress['total']} finished ({progress['percent']}%): "
+            f"{counts['succeeded']} succeeded, {counts['failed']} failed, {counts['cancelled']} cancelled, "
+            f"{counts['running']} running, {counts['queued']} queued")
+    if progress['articles_per_minute']:
+        line += f" | {progress['articles_per_minute']} articles/min"
+    if progress['eta_seconds'] is not None:
+        line += f" | ETA {progress['eta_seconds'] // 60}m{progress['eta_seconds'] % 60:02d}s"
+    return line
+
+async def watch_batch(db: Database, batch_id: str, interval: float = 15) -> Dict:
+    """Print progress every `interval` seconds until every job in the batch has finished"""
+    while True:
+        progress = await asyncio.to_thread(batch_progress, db, batch_id)
+        if progress is None:
+            raise ValueError(f"Unknown batch {batch_id}")
+        print(f"[{batch_id}] {format_progress(progress)}", flush=True)
+        if progress['done']:
+            return progress
+        await asyncio.sleep(interval)
+
+async def work_batch(db: Database, batch_id: str, concurrency: int, interval: float = 15) -> Dict:
+    """
+    Run a generation worker in this process until the batch has finished.
+
+    The worker drains the shared queue, so it may also pick up jobs from
+    outside the batch; it stops claiming once the batch is done and lets
+    those finish.
+    """
+    from worker import build_worker
+
+    worker = build_worker(db, concurrency=concurrency)
+    worker_task = asyncio.create_task(worker.run())
+    try:
+        progress = await watch_batch(db, batch_id, interval)
+    finally:
+        worker.stop()
+        await worker_task
+    return progress
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    parser = argparse.ArgumentParser(description='Bulk article generation from a JSONL or CSV manifest')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    submit = subparsers.add_parser('submit', help='Queue every prompt in a manifest')
+    submit.add_argument('manifest', help='Path to a .jsonl or .csv manifest')
+    submit.add_argument('--name', help='Batch name (defaults to the manifest file name)')
+    submit.add_argument('--watch', action='store_true', help='Report progress until the batch finishes')
+    submit.add_argument('--work', action='store_true',
+                        help='Also run a generation worker in this process until the batch finishes')
+    submit.add_argument('--concurrency', type=int, default=int(os.getenv('WORKER_CONCURRENCY', '4')),
+                        help='Articles generated at once with --work')
+    submit.add_argument('--interval', type=float, default=15, help='Seconds between progress reports')
+
+    status = subparsers.add_parser('status', help='Report progress of a batch')
+    status.add_argument('batch_id')
+    status.add_argument('--watch', action='store_true', help='Report progress until the batch finishes')
+    status.add_argument('--interval', type=float, default=15, help='Seconds between progress reports')
+
+    args = parser.parse_args()
+    db = Database(
+        url=os.getenv('SUPABASE_URL'),
+        key=os.getenv('SUPABASE_KEY')
+    )
+
+    if args.command == 'submit':
+        try:
+            with open(args.manifest, encoding='utf-8') as f:
+                articles = parse_manifest(f.read(), manifest_format(args.manifest))
+        except (OSError, ManifestError) as e:
+            print(f"Invalid manifest: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        batch_id, _ = submit_batch(db, articles, args.name or os.path.basename(args.manifest), DuplicateIndex(db))
+        print(f"Queued batch {batch_id} with {len(articles)} articles")
+        if args.work:
+            asyncio.run(work_batch(db, batch_id, args.concurrency, args.interval))
+        elif args.watch:
+            asyncio.run(watch_batch(db, batch_id, args.interval))
+    else:
+        if args.watch:
+            asyncio.run(watch_batch(db, args.batch_id, args.interval))
+        else:
+            progress = batch_progress(db, args.batch_id)
+            if progress is None:
+                print(f"Unknown batch {args.batch_id}", file=sys.stderr)
+                sys.exit(1)
+            print(format_progress(progress))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with an entry cap, optional byte cap and optional TTL"""
+
+    def __init__(self, max_entries: int = 256, max_bytes: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, size, stored_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Returns a cached value and marks it as recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, size, stored_at = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                self._remove(key)
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Stores a value, evicting least recently used entries over the caps"""
+        size = self._size_of(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = (value, size, time.time())
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+
+    def delete(self, key: str) -> None:
+        """Removes a key if present"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    @staticmethod
+    def _size_of(value: Any) -> int:
+        if isinstance(value, (str, bytes)):
+            return len(value)
+        return 1
+
+class DiskCache:
+    """
+    Size-capped on-disk cache of JSON-serializable values.
+
+    Each entry is a gzip-compressed JSON file named by the SHA-256 of its key.
+    Reads refresh the file's mtime so eviction removes the least recently used
+    files first. Writes are atomic, so several processes can share a directory.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024, ttl: Optional[float] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._bytes = self._scan_size()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Returns a cached value, or default if missing or expired"""
+        path = self._path(key)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return default
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache entry {path}: {str(e)}")
+            self._discard(path)
+            return default
+
+        if entry.get('key') != key:
+            return default
+        if self.ttl is not None and time.time() - entry.get('stored_at', 0) > self.ttl:
+            self._discard(path)
+            return default
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry['value']
+
+    def set(self, key: str, value: Any) -> None:
+        """Stores a value, evicting the least recently used files over the size cap"""
+        path = self._path(key)
+        entry = {'key': key, 'stored_at': time.time(), 'value': value}
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                    f.write(json.dumps(entry).encode('utf-8'))
+            size = os.path.getsize(tmp_path)
+            # An overwritten entry's old file no longer counts towards the total
+            try:
+                replaced_size = os.path.getsize(path)
+            except OSError:
+                replaced_size = 0
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to write cache entry for {key}: {str(e)}")
+            return
+
+        with self._lock:
+            self._bytes = max(self._bytes + size - replaced_size, 0)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def delete(self, key: str) -> None:
+        self._discard(self._path(key))
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json.gz")
+
+    def _entry_files(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.json.gz'):
+                yield os.path.join(self.directory, name)
+
+    def _scan_size(self) -> int:
+        total = 0
+        for path in self._entry_files():
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+    def _evict(self) -> None:
+        """Deletes oldest files until the directory is back under 90% of the cap"""
+        files = []
+        for path in self._entry_files():
+            try:
+                stat = os.stat(path)
+                files.append((stat.st_mtime, stat.st_size, path))
+            except OSError:
+                pass
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in files:
+            if total <= target:
+                break
+            self._unlink(path)
+            total -= size
+        self._bytes = total
+
+    def _unlink(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _discard(self, path: str) -> None:
+        """Deletes one entry file and takes its size off the running total"""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._bytes = max(self._bytes - size, 0)
+
+class RenderCache:
+    """
+    Cache of rendered article HTML keyed by the final version id.
+
+    A new final version has a new id, so it never hits a stale entry. The
+    cache also remembers which version it last rendered for each article and
+    drops the superseded entry when a newer one shows up. That memory is an
+    LRU of max_tracked articles; a superseded entry of an article it has
+    forgotten is never hit again and ages out of the caches like any other.
+    """
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = 32 * 1024 * 1024,
+                 disk_dir: Optional[str] = None, disk_max_bytes: int = 256 * 1024 * 1024,
+                 max_tracked: int = 10000):
+        self.memory = LRUCache(max_entries=max_entries, max_bytes=max_bytes)
+        self.disk = DiskCache(disk_dir, max_bytes=disk_max_bytes) if disk_dir else None
+        self._current_versions = LRUCache(max_entries=max_tracked)
+        self._lock = threading.Lock()
+
+    def get(self, article_id: str, version_id: str) -> Optional[str]:
+        """Returns cached HTML for a version, checking memory then disk"""
+        self._track_version(article_id, version_id)
+        html = self.memory.get(version_id)
+        if html is None and self.disk is not None:
+            html = self.disk.get(version_id)
+            if html is not None:
+                self.memory.set(version_id, html)
+        return html
+
+    def set(self, article_id: str, version_id: str, html: str) -> None:
+        self._track_version(article_id, version_id)
+        self.memory.set(version_id, html)
+        if self.disk is not None:
+            self.disk.set(version_id, html)
+
+    def get_or_render(self, article_id: str, version_id: str, render: Callable[[], str]) -> str:
+        """
+        Returns cached HTML for a version, rendering and storing it on a miss.
+
+        Args:
+            article_id: The ID of the article
+            version_id: The article_versions.id of the final editor version
+            render: Callable producing the HTML when nothing is cached
+        """
+        html = self.get(article_id, version_id)
+        if html is None:
+            html = render()
+            self.set(article_id, version_id, html)
+        return html
+
+    def invalidate(self, article_id: str) -> None:
+        """Drops whatever is cached for an article"""
+        with self._lock:
+            version_id = self._current_versions.get(article_id)
+            self._current_versions.delete(article_id)
+        if version_id:
+            self._drop(version_id)
+
+    def _track_version(self, article_id: str, version_id: str) -> None:
+        with self._lock:
+            previous = self._current_versions.get(article_id)
+            if previous != version_id:
+                self._current_versions.set(article_id, version_id)
+        if previous and previous != version_id:
+            self._drop(previous)
+
+    def _drop(self, version_id: str) -> None:
+        self.memory.delete(version_id)
+        if self.disk is not None:
+            self.disk.delete(version_id)
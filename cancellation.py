@@ -0,0 +1,79 @@
+import asyncio
+import contextvars
+import threading
+from typing import Awaitable, Optional
+
+class PipelineCancelled(Exception):
+    """Raised inside a pipeline whose job was paused or deleted"""
+
+class CancellationToken:
+    """
+    Cancellation flag for one running job.
+
+    The worker's heartbeat thread cancels it when the web tier pauses or
+    deletes the article; the pipeline checks it between stages and races
+    agent calls against it, so a cancelled job frees its slot right away.
+    """
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.reason: Optional[str] = None
+        self._cancelled = threading.Event()
+        self._event = asyncio.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self, reason: str) -> None:
+        """Cancel the job; safe to call from any thread"""
+        if self._cancelled.is_set():
+            return
+        self.reason = reason
+        self._cancelled.set()
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._event.set)
+        else:
+            self._event.set()
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise PipelineCancelled(self.reason)
+
+    async def race(self, awaitable: Awaitable):
+        """Await something, giving up with PipelineCancelled as soon as the token is cancelled"""
+        if self.cancelled:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise PipelineCancelled(self.reason)
+        task = asyncio.ensure_future(awaitable)
+        waiter = asyncio.ensure_future(self._event.wait())
+        try:
+            done, _ = await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+        if task in done:
+            return task.result()
+        # An agent call already running on a thread finishes there; its result is discarded
+        task.cancel()
+        raise PipelineCancelled(self.reason)
+
+# Token of the job whose pipeline is running in the current task (None outside the worker)
+current_token: contextvars.ContextVar = contextvars.ContextVar('cancellation_token', default=None)
+
+def check_cancelled() -> None:
+    """Raise PipelineCancelled if the current job has been cancelled"""
+    token = current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+def is_cancelled() -> bool:
+    token = current_token.get()
+    return token is not None and token.cancelled
+
+async def cancellable(awaitable: Awaitable):
+    """Await something, aborting early if the current job is cancelled"""
+    token = current_token.get()
+    if token is None:
+        return await awaitable
+    return await token.race(awaitable)
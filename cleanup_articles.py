@@ -54,11 +54,11 @@ async def cleanup_articles():
         for article in completed_articles:
             article_id = article['id']
             
-            # Get all versions for this article
-            versions = db.get_article_versions(article_id)
+            # Get the stage manifest for this article (no version content)
+            manifest = db.get_article_manifest(article_id)
             
             # Check for missing stages
-            missing_stages = check_article_stages(versions)
+            missing_stages = check_article_stages(manifest)
             
             if missing_stages:
                 # Article is in inconsistent state
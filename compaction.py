@@ -0,0 +1,132 @@
+import math
+import re
+from collections import Counter
+from typing import List
+from rate_limiter import estimate_tokens
+
+# Token budget for the research handed to the writer, by research scope
+RESEARCH_BUDGETS = {'basic': 1500, 'thorough': 3000, 'comprehensive': 5000}
+
+# Longer articles need proportionally more material to draw on
+LENGTH_FACTORS = {'short': 0.6, 'medium': 1.0, 'long': 1.5}
+
+STOPWORDS = {
+    'about', 'after', 'also', 'been', 'being', 'between', 'both', 'could', 'does', 'each', 'from',
+    'have', 'into', 'more', 'most', 'much', 'only', 'other', 'over', 'such', 'than', 'that', 'their',
+    'them', 'then', 'there', 'these', 'they', 'this', 'those', 'through', 'very', 'were', 'what',
+    'when', 'where', 'which', 'while', 'will', 'with', 'would', 'your'
+}
+
+def research_budget(target_length: str, research_scope: str) -> int:
+    """Token budget for compacted research given the article's length and scope"""
+    base = RESEARCH_BUDGETS.get(research_scope, RESEARCH_BUDGETS['thorough'])
+    return int(base * LENGTH_FACTORS.get(target_length, 1.0))
+
+def _normalize(text: str) -> str:
+    return ' '.join(re.findall(r'[a-z0-9]+', text.lower()))
+
+def _content_words(text: str) -> List[str]:
+    return [w for w in re.findall(r'[a-z0-9]+', text.lower()) if len(w) > 3 and w not in STOPWORDS]
+
+def _is_heading(line: str) -> bool:
+    return bool(re.match(r'^\s*(#+\s|\*\*[^*]+\*\*:?\s*$|\d+\.\s+\*\*[^*]+\*\*:?\s*$)', line))
+
+def dedupe_lines(text: str) -> str:
+    """Drop repeated lines (ignoring case, punctuation and list markers) and blank-line runs"""
+    seen = set()
+    kept = []
+    for line in text.splitlines():
+        key = _normalize(re.sub(r'^\s*(?:[-*+]|\d+[.)])\s+', '', line))
+        if key and not _is_heading(line):
+            if key in seen:
+                continue
+            seen.add(key)
+        if not line.strip() and kept and not kept[-1].strip():
+            continue
+        kept.append(line)
+    return '\n'.join(kept).strip()
+
+def _is_structured(paragraph: str) -> bool:
+    """Lists and tables, whose repeated lines are usually deliberate"""
+    return any(re.match(r'^\s*(?:[-*+]|\d+[.)]|\|)', line) for line in paragraph.splitlines())
+
+def collapse_repeated_paragraphs(text: str) -> str:
+    """
+    Drop a paragraph that exactly repeats the one right before it.
+
+    Meant for article drafts, which are published after editing: nothing
+    inside code fences, lists or tables is touched, and paragraphs that
+    repeat further apart are kept.
+    """
+    # Odd positions are the blank-line separators, kept verbatim
+    parts = re.split(r'(\n[ \t]*\n)', text)
+    kept = [parts[0]]
+    in_fence = False
+    previous = None
+    for position in range(0, len(parts), 2):
+        paragraph = parts[position]
+        fence_lines = sum(1 for line in paragraph.splitlines() if line.lstrip().startswith(('```', '~~~')))
+        protected = in_fence or fence_lines > 0 or _is_structured(paragraph)
+        if fence_lines % 2:
+            in_fence = not in_fence
+        repeated = not protected and paragraph.strip() and paragraph.strip() == previous
+        if position and not repeated:
+            kept.extend([parts[position - 1], paragraph])
+        if paragraph.strip():
+            previous = None if protected else paragraph.strip()
+    return ''.join(kept)
+
+def compact_research(text: str, budget_tokens: int) -> str:
+    """
+    Deduplicate research and extract the most informative lines within a token budget.
+
+    Lines are scored by how many of the document's frequent content words
+    they contain, with a bonus for figures, quotes and links, which the
+    writer needs verbatim. The best lines are kept in their original order
+    under their headings until the budget is spent.
+    """
+    text = dedupe_lines(text)
+    if estimate_tokens(text) <= budget_tokens:
+        return text
+
+    lines = text.splitlines()
+    frequencies = Counter(_content_words(text))
+
+    def score(line: str) -> float:
+        words = _content_words(line)
+        if not words:
+            return 0.0
+        value = sum(math.log1p(frequencies[w]) for w in set(words)) / math.sqrt(len(words))
+        if re.search(r'\d', line):
+            value *= 1.3
+        if re.search(r'["“”]', line):
+            value *= 1.3
+        if re.search(r'https?://', line):
+            value *= 1.5
+        return value
+
+    candidates = sorted(
+        (i for i, line in enumerate(lines) if line.strip() and not _is_heading(line)),
+        key=lambda i: -score(lines[i])
+    )
+    chosen = set()
+    spent = sum(estimate_tokens(line) for line in lines if _is_heading(line))
+    for i in candidates:
+        cost = estimate_tokens(lines[i])
+        if spent + cost > budget_tokens:
+            continue
+        chosen.add(i)
+        spent += cost
+
+    # Keep a heading only if something under it survived
+    compacted = []
+    pending_heading = None
+    for i, line in enumerate(lines):
+        if _is_heading(line):
+            pending_heading = line
+        elif i in chosen:
+            if pending_heading is not None:
+                compacted.append(pending_heading)
+                pending_heading = None
+            compacted.append(line)
+    return '\n'.join(compacted)
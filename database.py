@@ -1,18 +1,26 @@
-from datetime import datetime
-from typing import Optional, List, Dict
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Tuple
+import base64
+import json
+import uuid
 from pydantic import BaseModel
 from supabase import create_client, Client
+from scheduling import job_priority
 
 class ArticleBase(BaseModel):
     title: str
     prompt: str
     target_length: str  # 'short', 'medium', 'long'
     research_scope: str  # 'basic', 'thorough', 'comprehensive'
+    drafting_mode: str = 'single'  # 'single', 'sections'
+    origin: str = 'manual'  # 'manual', 'trending', 'batch' (see migration 0015)
 
 class Article(ArticleBase):
     id: str
     status: str
     current_agent: Optional[str]
+    has_all_stages: bool = False
+    final_version_id: Optional[str] = None
     created_at: datetime
     updated_at: datetime
 
@@ -43,6 +51,21 @@ class Database:
         'error'
     }
 
+    # Drafting modes for the writing stage (see migration 0008)
+    DRAFTING_MODES = {'single', 'sections'}
+
+    # (stage, agent) pairs an article must have before it is published
+    REQUIRED_STAGES = [
+        ('planning', 'manager'),
+        ('research', 'researcher'),
+        ('draft', 'writer'),
+        ('final', 'editor')
+    ]
+
+    # Page size limits for keyset-paginated listings
+    DEFAULT_PAGE_SIZE = 20
+    MAX_PAGE_SIZE = 100
+
     def __init__(self, url: str, key: str):
         self.client: Client = create_client(url, key)
 
@@ -129,6 +152,51 @@ class Database:
         except Exception as e:
             raise Exception(f"Error getting article versions: {str(e)}")
 
+    def get_article_manifest(self, article_id: str) -> List[Dict]:
+        """
+        Gets the stage manifest of an article without any version content.
+        
+        Args:
+            article_id: The ID of the article
+            
+        Returns:
+            List of versions with only id, stage, agent and created_at
+        """
+        try:
+            response = self.client.table('article_versions')\
+                .select('id, stage, agent, created_at')\
+                .eq('article_id', article_id)\
+                .order('created_at')\
+                .execute()
+            return response.data
+        except Exception as e:
+            raise Exception(f"Error getting article manifest: {str(e)}")
+
+    def get_article_version(self, version_id: str) -> Optional[Dict]:
+        """Gets a single article version, including its content, by ID"""
+        try:
+            response = self.client.table('article_versions')\
+                .select('*')\
+                .eq('id', version_id)\
+                .execute()
+            if response.data:
+                return response.data[0]
+            return None
+        except Exception as e:
+            raise Exception(f"Error getting article version: {str(e)}")
+
+    def get_missing_stages(self, manifest: List[Dict]) -> List[str]:
+        """Lists the required stages absent from a manifest, as 'stage by agent'"""
+        present = {(v['stage'], v['agent']) for v in manifest}
+        return [f"{stage} by {agent}" for stage, agent in self.REQUIRED_STAGES if (stage, agent) not in present]
+
+    def find_latest_version(self, manifest: List[Dict], stage: str, agent: str) -> Optional[Dict]:
+        """Finds the most recent manifest entry for a (stage, agent) pair"""
+        matches = [v for v in manifest if v['stage'] == stage and v['agent'] == agent]
+        if not matches:
+            return None
+        return max(matches, key=lambda v: v['created_at'])
+
     def create_article_version(self, article_id: str, content: str, agent: str, stage: str) -> None:
         """Creates a new version of an article"""
         try:
@@ -142,6 +210,27 @@ class Database:
         except Exception as e:
             raise Exception(f"Error creating article version: {str(e)}")
 
+    # ===== TRENDING TOPICS =====
+
+    def get_trending_topics_state(self) -> Tuple[int, Optional[str]]:
+        """
+        Gets a cheap fingerprint of the active trending topics for HTTP cache validators.
+
+        Returns:
+            Tuple of (number of active topics, latest updated_at among them)
+        """
+        try:
+            response = self.client.table('trending_topics')\
+                .select('updated_at', count='exact')\
+                .eq('status', 'active')\
+                .order('updated_at', desc=True)\
+                .limit(1)\
+                .execute()
+            last_updated = response.data[0]['updated_at'] if response.data else None
+            return response.count or 0, last_updated
+        except Exception as e:
+            raise Exception(f"Error getting trending topics state: {str(e)}")
+
     # ===== TAG MANAGEMENT =====
     
     def create_tag(self, name: str, color: str = '#3b82f6') -> str:
@@ -195,11 +284,183 @@ class Database:
         except Exception as e:
             raise Exception(f"Error getting article tags: {str(e)}")
 
-    def search_articles(self, query: str = '', tags: Optional[List[str]] = None, date_from: Optional[str] = None, date_to: Optional[str] = None, target_length: Optional[str] = None) -> List[Dict]:
-        """Search articles with various filters"""
+    def get_published_articles(self, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Gets one page of the published article feed in a single query.
+
+        Relies on the has_all_stages flag maintained by the article_versions
+        trigger (migration 0004) and embeds each article's tags.
+
+        Args:
+            limit: Page size, clamped to MAX_PAGE_SIZE
+            cursor: Cursor returned with the previous page, or None for the first page
+
+        Returns:
+            Tuple of (completed articles newest first with a 'tags' list, next page cursor)
+        """
+        try:
+            query_builder = self.client.table('articles')\
+                .select('*, article_tags(tags(id, name, color))')\
+                .eq('status', 'completed')\
+                .eq('has_all_stages', True)
+            articles, next_cursor = self._paginate(query_builder, limit, cursor)
+            return [self._flatten_tags(article) for article in articles], next_cursor
+        except ValueError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error getting published articles: {str(e)}")
+
+    def get_published_articles_updated_since(self, updated_after: str, limit: int = MAX_PAGE_SIZE) -> List[Dict]:
+        """
+        Gets published articles updated at or after a timestamp, oldest update first.
+
+        Used to catch a search index up with articles completed elsewhere;
+        callers page by passing the last row's updated_at back in.
+        """
+        try:
+            response = self.client.table('articles')\
+                .select('*, article_tags(tags(id, name, color))')\
+                .eq('status', 'completed')\
+                .eq('has_all_stages', True)\
+                .gte('updated_at', updated_after)\
+                .order('updated_at')\
+                .limit(self.clamp_page_size(limit))\
+                .execute()
+            return [self._flatten_tags(article) for article in response.data]
+        except Exception as e:
+            raise Exception(f"Error getting recently updated articles: {str(e)}")
+
+    def get_published_feed_state(self) -> Tuple[int, Optional[str]]:
+        """
+        Gets a cheap fingerprint of the published feed for HTTP cache validators.
+
+        Returns:
+            Tuple of (number of published articles, latest updated_at among them)
+        """
         try:
+            response = self.client.table('articles')\
+                .select('updated_at', count='exact')\
+                .eq('status', 'completed')\
+                .eq('has_all_stages', True)\
+                .order('updated_at', desc=True)\
+                .limit(1)\
+                .execute()
+            last_updated = response.data[0]['updated_at'] if response.data else None
+            return response.count or 0, last_updated
+        except Exception as e:
+            raise Exception(f"Error getting published feed state: {str(e)}")
+
+    def list_articles(self, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Gets one page of all articles (prompts) regardless of status.
+
+        Returns:
+            Tuple of (articles newest first, next page cursor)
+        """
+        try:
+            return self._paginate(self.client.table('articles').select('*'), limit, cursor)
+        except ValueError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error listing articles: {str(e)}")
+
+    # ===== KEYSET PAGINATION =====
+
+    def clamp_page_size(self, limit: Optional[int]) -> int:
+        """Bounds a requested page size to 1..MAX_PAGE_SIZE"""
+        if not limit:
+            return self.DEFAULT_PAGE_SIZE
+        return max(1, min(int(limit), self.MAX_PAGE_SIZE))
+
+    @staticmethod
+    def encode_cursor(row: Dict) -> str:
+        """Encodes the (created_at, id) position of a row as an opaque cursor"""
+        payload = json.dumps([row['created_at'], row['id']], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[str, str]:
+        """Decodes a cursor into (created_at, id); raises ValueError if malformed"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            # Both values end up in a PostgREST filter, so they must be what they claim to be
+            datetime.fromisoformat(str(created_at).replace('Z', '+00:00'))
+            return str(created_at), str(uuid.UUID(str(row_id)))
+        except Exception:
+            raise ValueError(f"Invalid page cursor: {cursor}")
+
+    def _paginate(self, query_builder, limit: Optional[int], cursor: Optional[str]) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Applies keyset pagination on (created_at, id), newest first.
+
+        Fetches one row more than the page size to learn whether another page
+        exists, so no count query is needed.
+        """
+        limit = self.clamp_page_size(limit)
+        if cursor:
+            created_at, row_id = self.decode_cursor(cursor)
+            query_builder = query_builder.or_(
+                f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{row_id})'
+            )
+        response = query_builder\
+            .order('created_at', desc=True)\
+            .order('id', desc=True)\
+            .limit(limit + 1)\
+            .execute()
+        rows = response.data
+        if len(rows) > limit:
+            return rows[:limit], self.encode_cursor(rows[limit - 1])
+        return rows, None
+
+    def _flatten_tags(self, article: Dict) -> Dict:
+        """Replaces an embedded article_tags relation with a plain 'tags' list"""
+        tag_relations = article.pop('article_tags', None) or []
+        article['tags'] = [rel['tags'] for rel in tag_relations if rel.get('tags')]
+        return article
+
+    def get_articles_by_ids(self, article_ids: List[str]) -> List[Dict]:
+        """
+        Gets completed articles by ID, with tags embedded, in the order given.
+        
+        Args:
+            article_ids: Article IDs, e.g. a page of ranked search results
+        """
+        if not article_ids:
+            return []
+        try:
+            response = self.client.table('articles')\
+                .select('*, article_tags(tags(id, name, color))')\
+                .in_('id', article_ids)\
+                .eq('status', 'completed')\
+                .execute()
+            by_id = {article['id']: self._flatten_tags(article) for article in response.data}
+            return [by_id[article_id] for article_id in article_ids if article_id in by_id]
+        except Exception as e:
+            raise Exception(f"Error getting articles by ID: {str(e)}")
+
+    def search_articles(self, query: str = '', tags: Optional[List[str]] = None, date_from: Optional[str] = None, date_to: Optional[str] = None, target_length: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None, tag_mode: str = 'any') -> Tuple[List[Dict], Optional[str]]:
+        """
+        Search articles with various filters, one page at a time.
+
+        Tag filters are resolved in the database (search_articles_by_tags,
+        migration 0013), which returns one keyset page of matching ids; only
+        that page's rows are then fetched.
+
+        Args:
+            tag_mode: 'any' to match articles with any of the tags, 'all' for every tag
+
+        Returns:
+            Tuple of (matching articles newest first with a 'tags' list, next page cursor)
+        """
+        if tag_mode not in ('any', 'all'):
+            raise ValueError(f"Invalid tag mode '{tag_mode}'. Must be 'any' or 'all'")
+        try:
+            if tags:
+                return self._search_by_tags(query, tags, tag_mode, date_from, date_to, target_length, limit, cursor)
+
             # Start with base query
-            query_builder = self.client.table('articles').select('*, article_tags(tags(name, color))')
+            query_builder = self.client.table('articles').select('*, article_tags(tags(id, name, color))')
             
             # Add text search if query provided
             if query:
@@ -218,24 +479,40 @@ class Database:
             # Only show completed articles
             query_builder = query_builder.eq('status', 'completed')
             
-            # Order by creation date
-            query_builder = query_builder.order('created_at', desc=True)
-            
-            response = query_builder.execute()
-            
-            # Filter by tags if provided (post-processing since Supabase doesn't handle this well)
-            if tags:
-                filtered_articles = []
-                for article in response.data:
-                    article_tag_names = [tag_rel['tags']['name'] for tag_rel in article.get('article_tags', [])]
-                    if any(tag.lower() in article_tag_names for tag in tags):
-                        filtered_articles.append(article)
-                return filtered_articles
-            
-            return response.data
+            # Order by creation date, one page at a time
+            articles, next_cursor = self._paginate(query_builder, limit, cursor)
+            return [self._flatten_tags(article) for article in articles], next_cursor
+        except ValueError:
+            raise
         except Exception as e:
             raise Exception(f"Error searching articles: {str(e)}")
 
+    def _search_by_tags(self, query: str, tags: List[str], tag_mode: str, date_from: Optional[str], date_to: Optional[str],
+                        target_length: Optional[str], limit: Optional[int], cursor: Optional[str]) -> Tuple[List[Dict], Optional[str]]:
+        """One page of tag-filtered search, using the same (created_at, id) cursor format as _paginate"""
+        names = sorted({name.lower().strip() for name in tags if name.strip()})
+        if not names:
+            return [], None
+        limit = self.clamp_page_size(limit)
+        cursor_created_at, cursor_id = self.decode_cursor(cursor) if cursor else (None, None)
+        response = self.client.rpc('search_articles_by_tags', {
+            'tag_names': names,
+            'match_all': tag_mode == 'all',
+            'search_query': query or None,
+            'date_from': date_from[:10] if date_from else None,
+            'date_to': date_to[:10] if date_to else None,
+            'length_filter': target_length or None,
+            'cursor_created_at': cursor_created_at,
+            'cursor_id': cursor_id,
+            'page_size': limit + 1
+        }).execute()
+        rows = response.data or []
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self.encode_cursor(rows[-1])
+        return self.get_articles_by_ids([row['id'] for row in rows]), next_cursor
+
     # ===== ANALYTICS =====
     
     def track_article_view(self, article_id: str, session_id: str, ip_address: Optional[str] = None, user_agent: Optional[str] = None, referrer: Optional[str] = None) -> None:
@@ -356,8 +633,10 @@ class Database:
         except Exception as e:
             raise Exception(f"Error tracking performance start: {str(e)}")
 
-    def track_performance_end(self, metric_id: str, success: bool = True, error_message: Optional[str] = None, tokens_used: Optional[int] = None) -> None:
-        """Track the end of a performance metric"""
+    def track_performance_end(self, metric_id: str, success: bool = True, error_message: Optional[str] = None, tokens_used: Optional[int] = None,
+                              input_tokens: Optional[int] = None, output_tokens: Optional[int] = None,
+                              uncompacted_input_tokens: Optional[int] = None) -> None:
+        """Track the end of a performance metric, with the stage's token counts if known"""
         try:
             end_time = datetime.utcnow()
             
@@ -377,7 +656,10 @@ class Database:
                         'duration_seconds': duration_seconds,
                         'success': success,
                         'error_message': error_message,
-                        'tokens_used': tokens_used
+                        'tokens_used': tokens_used,
+                        'input_tokens': input_tokens,
+                        'output_tokens': output_tokens,
+                        'uncompacted_input_tokens': uncompacted_input_tokens
                     })\
                     .eq('id', metric_id)\
                     .execute()
@@ -439,4 +721,330 @@ class Database:
                 .execute()
             return response.data
         except Exception as e:
-            raise Exception(f"Error getting articles for moderation: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Error getting articles for moderation: {str(e)}")
+
+    # ===== DUPLICATE DETECTION =====
+
+    def upsert_minhash_signatures(self, rows: List[Dict], chunk_size: int = 500) -> None:
+        """
+        Stores MinHash signatures, replacing any an article already has of the same kind.
+
+        Each row has article_id, kind, signature and band_keys (see migration 0014).
+        """
+        try:
+            for start in range(0, len(rows), chunk_size):
+                chunk = [
+                    {**row, 'updated_at': datetime.utcnow().isoformat()}
+                    for row in rows[start:start + chunk_size]
+                ]
+                self.client.table('minhash_signatures')\
+                    .upsert(chunk, on_conflict='article_id,kind')\
+                    .execute()
+        except Exception as e:
+            raise Exception(f"Error storing MinHash signatures: {str(e)}")
+
+    def find_minhash_candidates(self, kind: str, band_keys: List[str], exclude: Optional[str] = None,
+                                limit: int = MAX_PAGE_SIZE) -> List[Dict]:
+        """Articles whose signature of this kind shares a band bucket, with title, created_at and signature"""
+        try:
+            response = self.client.rpc('find_minhash_candidates', {
+                'signature_kind': kind,
+                'keys': band_keys,
+                'exclude_id': exclude,
+                'max_candidates': limit
+            }).execute()
+            return response.data or []
+        except Exception as e:
+            raise Exception(f"Error finding MinHash candidates: {str(e)}")
+
+    # ===== GENERATION JOBS =====
+
+    def enqueue_job(self, payload: Dict, article_id: Optional[str] = None, kind: str = 'create_article',
+                    max_attempts: int = 3, batch_id: Optional[str] = None, priority: Optional[Dict] = None) -> str:
+        """
+        Adds an article generation job to the durable queue.
+
+        Args:
+            payload: Job parameters (prompt, target_length, research_scope, ...)
+            article_id: Article the job works on, if it already exists
+            kind: Job type understood by the worker
+            max_attempts: Attempts before the job is marked failed
+            batch_id: Batch the job was submitted with, if any
+            priority: Scheduling fields from scheduling.job_priority
+
+        Returns:
+            The job ID
+        """
+        try:
+            job_data = {
+                'article_id': article_id,
+                'kind': kind,
+                'payload': payload,
+                'max_attempts': max_attempts
+            }
+            if batch_id:
+                job_data['batch_id'] = batch_id
+            if priority:
+                job_data.update(priority)
+            response = self.client.table('generation_jobs').insert(job_data).execute()
+            return response.data[0]['id']
+        except Exception as e:
+            raise Exception(f"Error enqueuing job: {str(e)}")
+
+    def create_batch(self, name: Optional[str], total: int) -> str:
+        """Creates a generation batch record and returns its ID"""
+        try:
+            response = self.client.table('generation_batches').insert({
+                'name': name,
+                'total': total
+            }).execute()
+            return response.data[0]['id']
+        except Exception as e:
+            raise Exception(f"Error creating batch: {str(e)}")
+
+    def enqueue_batch_articles(self, batch_id: str, articles: List[Dict], chunk_size: int = 100) -> List[str]:
+        """
+        Creates pending articles and queues a create_article job for each, in bulk.
+
+        Rows are inserted chunk_size at a time, so a manifest of hundreds of
+        articles takes a handful of requests rather than two per article. If
+        a chunk's jobs can't be inserted, its articles are deleted again so
+        no pending article is left without a job; earlier chunks stay queued.
+
+        Returns:
+            The article IDs, in manifest order
+        """
+        try:
+            article_ids = []
+            for start in range(0, len(articles), chunk_size):
+                chunk = articles[start:start + chunk_size]
+                response = self.client.table('articles').insert([
+                    {**article, 'origin': 'batch'} for article in chunk
+                ]).execute()
+                ids = [row['id'] for row in response.data]
+                try:
+                    self._insert_batch_jobs(batch_id, ids, chunk)
+                except Exception:
+                    self.client.table('articles').delete().in_('id', ids).execute()
+                    raise
+                article_ids.extend(ids)
+            return article_ids
+        except Exception as e:
+            raise Exception(f"Error enqueuing batch articles after {len(article_ids)} queued: {str(e)}")
+
+    def _insert_batch_jobs(self, batch_id: str, article_ids: List[str], articles: List[Dict]) -> None:
+        """Queues a create_article job for each of a chunk of batch articles, in one request"""
+        self.client.table('generation_jobs').insert([
+            {
+                'article_id': article_id,
+                'kind': 'create_article',
+                'batch_id': batch_id,
+                **job_priority('batch', article['target_length']),
+                'payload': {
+                    'prompt': article['prompt'],
+                    'target_length': article['target_length'],
+                    'research_scope': article['research_scope'],
+                    'drafting_mode': article.get('drafting_mode', 'single')
+                }
+            }
+            for article_id, article in zip(article_ids, articles)
+        ]).execute()
+
+    def get_batch(self, batch_id: str) -> Optional[Dict]:
+        """Gets a generation batch by ID"""
+        try:
+            response = self.client.table('generation_batches').select('*').eq('id', batch_id).execute()
+            if response.data:
+                return response.data[0]
+            return None
+        except Exception as e:
+            raise Exception(f"Error getting batch: {str(e)}")
+
+    def get_batch_jobs(self, batch_id: str, page_size: int = 1000) -> List[Dict]:
+        """
+        Gets the status and timing of every job in a batch (no payloads).
+
+        PostgREST caps a response at its max_rows (1000 by default), so the
+        jobs are fetched a page at a time, ordered by id for stable pages,
+        until an empty page; a server cap below page_size just means more pages.
+        """
+        try:
+            jobs = []
+            while True:
+                response = self.client.table('generation_jobs')\
+                    .select('id, article_id, status, attempts, last_error, started_at, finished_at')\
+                    .eq('batch_id', batch_id)\
+                    .order('id')\
+                    .range(len(jobs), len(jobs) + page_size - 1)\
+                    .execute()
+                if not response.data:
+                    return jobs
+                jobs.extend(response.data)
+        except Exception as e:
+            raise Exception(f"Error getting batch jobs: {str(e)}")
+
+    def claim_job(self, worker_id: str, lease_seconds: int, settings: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Atomically claims the highest-priority ready job for a worker, or returns None.
+
+        settings are the scheduler parameters from scheduling.claim_settings.
+        """
+        try:
+            response = self.client.rpc('claim_generation_job', {
+                'worker_id': worker_id,
+                'lease_seconds': lease_seconds,
+                **(settings or {})
+            }).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            raise Exception(f"Error claiming job: {str(e)}")
+
+    def renew_job_lease(self, job_id: str, worker_id: str, lease_seconds: int) -> bool:
+        """Extends a job lease; returns False if the worker has lost the job"""
+        try:
+            response = self.client.rpc('renew_generation_job_lease', {
+                'job_id': job_id,
+                'worker_id': worker_id,
+                'lease_seconds': lease_seconds
+            }).execute()
+            return bool(response.data)
+        except Exception as e:
+            raise Exception(f"Error renewing job lease: {str(e)}")
+
+    def complete_job(self, job_id: str, worker_id: str, article_id: Optional[str] = None) -> None:
+        """Marks a job the worker owns as succeeded"""
+        try:
+            update_data = {
+                'status': 'succeeded',
+                'finished_at': datetime.utcnow().isoformat(),
+                'lease_owner': None,
+                'lease_expires_at': None,
+                'last_error': None
+            }
+            if article_id:
+                update_data['article_id'] = article_id
+            self.client.table('generation_jobs')\
+                .update(update_data)\
+                .eq('id', job_id)\
+                .eq('lease_owner', worker_id)\
+                .execute()
+        except Exception as e:
+            raise Exception(f"Error completing job: {str(e)}")
+
+    def fail_job(self, job: Dict, worker_id: str, error_message: str, retry_delay_seconds: int = 60) -> None:
+        """
+        Records a failed attempt, requeueing the job with a delay while attempts remain.
+
+        Args:
+            job: The claimed job row
+            worker_id: Worker that ran the attempt
+            error_message: Why the attempt failed
+            retry_delay_seconds: Delay before the job becomes claimable again
+        """
+        try:
+            update_data = {
+                'last_error': error_message,
+                'lease_owner': None,
+                'lease_expires_at': None
+            }
+            if job['attempts'] < job['max_attempts']:
+                update_data['status'] = 'queued'
+                update_data['run_after'] = (datetime.utcnow() + timedelta(seconds=retry_delay_seconds)).isoformat()
+            else:
+                update_data['status'] = 'failed'
+                update_data['finished_at'] = datetime.utcnow().isoformat()
+            self.client.table('generation_jobs')\
+                .update(update_data)\
+                .eq('id', job['id'])\
+                .eq('lease_owner', worker_id)\
+                .execute()
+        except Exception as e:
+            raise Exception(f"Error failing job: {str(e)}")
+
+    def cancel_article_jobs(self, article_id: str) -> None:
+        """
+        Cancels an article's generation jobs.
+
+        Queued jobs are cancelled outright; running jobs are flagged with
+        cancel_requested, which their worker polls and acts on.
+        """
+        try:
+            self.client.table('generation_jobs')\
+                .update({'status': 'cancelled', 'finished_at': datetime.utcnow().isoformat()})\
+                .eq('article_id', article_id)\
+                .eq('status', 'queued')\
+                .execute()
+            self.client.table('generation_jobs')\
+                .update({'cancel_requested': True})\
+                .eq('article_id', article_id)\
+                .eq('status', 'running')\
+                .execute()
+        except Exception as e:
+            raise Exception(f"Error cancelling jobs: {str(e)}")
+
+    def get_job_control(self, job_id: str) -> Optional[Dict]:
+        """Gets the fields a worker polls while running a job; None if the job was deleted"""
+        try:
+            response = self.client.table('generation_jobs')\
+                .select('status, cancel_requested, lease_owner')\
+                .eq('id', job_id)\
+                .execute()
+            if response.data:
+                return response.data[0]
+            return None
+        except Exception as e:
+            raise Exception(f"Error getting job control: {str(e)}")
+
+    def cancel_job(self, job_id: str, worker_id: str, reason: str) -> None:
+        """Marks a job the worker owns as cancelled"""
+        try:
+            self.client.table('generation_jobs')\
+                .update({
+                    'status': 'cancelled',
+                    'finished_at': datetime.utcnow().isoformat(),
+                    'lease_owner': None,
+                    'lease_expires_at': None,
+                    'last_error': reason
+                })\
+                .eq('id', job_id)\
+                .eq('lease_owner', worker_id)\
+                .execute()
+        except Exception as e:
+            raise Exception(f"Error cancelling job: {str(e)}")
+
+    def get_active_job(self, article_id: str) -> Optional[Dict]:
+        """
+        Gets the queued or running job for an article, if there is one.
+
+        A running job asked to cancel still counts until its worker records
+        the cancellation: it may be mid-stage and will still write versions
+        and the article status. Only once its lease has expired (the worker
+        died) is it ignored.
+        """
+        try:
+            response = self.client.table('generation_jobs')\
+                .select('*')\
+                .eq('article_id', article_id)\
+                .in_('status', ['queued', 'running'])\
+                .execute()
+            now = datetime.now(timezone.utc)
+            for job in response.data:
+                if job.get('cancel_requested') and (
+                    not job.get('lease_expires_at')
+                    or datetime.fromisoformat(job['lease_expires_at'].replace('Z', '+00:00')) < now
+                ):
+                    continue
+                return job
+            return None
+        except Exception as e:
+            raise Exception(f"Error getting active job: {str(e)}")
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Gets a generation job by ID"""
+        try:
+            response = self.client.table('generation_jobs').select('*').eq('id', job_id).execute()
+            if response.data:
+                return response.data[0]
+            return None
+        except Exception as e:
+            raise Exception(f"Error getting job: {str(e)}")
@@ -0,0 +1,58 @@
+-- Migration 0004: Precomputed "has all four stages" flag for the published feed
+-- Run this in Supabase SQL Editor
+
+-- Flag set once an article has planning, research, draft and final versions
+ALTER TABLE articles ADD COLUMN IF NOT EXISTS has_all_stages BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- Recompute the flag for one article from its versions
+CREATE OR REPLACE FUNCTION refresh_article_has_all_stages()
+RETURNS TRIGGER AS $$
+DECLARE
+    target_article_id UUID;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        target_article_id := OLD.article_id;
+    ELSE
+        target_article_id := NEW.article_id;
+    END IF;
+
+    UPDATE articles
+    SET has_all_stages = (
+        SELECT COUNT(DISTINCT (stage, agent)) = 4
+        FROM article_versions
+        WHERE article_id = target_article_id
+          AND (stage, agent) IN (
+              ('planning', 'manager'),
+              ('research', 'researcher'),
+              ('draft', 'writer'),
+              ('final', 'editor')
+          )
+    )
+    WHERE id = target_article_id;
+
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER refresh_article_has_all_stages
+    AFTER INSERT OR DELETE ON article_versions
+    FOR EACH ROW EXECUTE FUNCTION refresh_article_has_all_stages();
+
+-- Backfill existing articles
+UPDATE articles a
+SET has_all_stages = (
+    SELECT COUNT(DISTINCT (v.stage, v.agent)) = 4
+    FROM article_versions v
+    WHERE v.article_id = a.id
+      AND (v.stage, v.agent) IN (
+          ('planning', 'manager'),
+          ('research', 'researcher'),
+          ('draft', 'writer'),
+          ('final', 'editor')
+      )
+);
+
+-- Index for the published feed
+CREATE INDEX IF NOT EXISTS idx_article_versions_article_id ON article_versions(article_id);
+CREATE INDEX IF NOT EXISTS idx_articles_published_created_at ON articles(created_at DESC)
+    WHERE status = 'completed' AND has_all_stages;
@@ -0,0 +1,14 @@
+-- Migration 0005: Indexes for keyset pagination on (created_at, id)
+-- Run this in Supabase SQL Editor
+
+-- Prompts listing (all statuses)
+CREATE INDEX IF NOT EXISTS idx_articles_created_at_id ON articles(created_at DESC, id DESC);
+
+-- Search listing (completed articles)
+CREATE INDEX IF NOT EXISTS idx_articles_completed_created_at_id ON articles(created_at DESC, id DESC)
+    WHERE status = 'completed';
+
+-- Published feed: replace the single-column index from 0004 with a keyset one
+DROP INDEX IF EXISTS idx_articles_published_created_at;
+CREATE INDEX IF NOT EXISTS idx_articles_published_created_at_id ON articles(created_at DESC, id DESC)
+    WHERE status = 'completed' AND has_all_stages;
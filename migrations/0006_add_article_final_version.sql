@@ -0,0 +1,78 @@
+-- Migration 0006: Track the final version id on articles for cache validators
+-- Run this in Supabase SQL Editor
+
+-- Id of the latest final version written by the editor
+ALTER TABLE articles ADD COLUMN IF NOT EXISTS final_version_id UUID REFERENCES article_versions(id) ON DELETE SET NULL;
+
+-- Recompute the stage flag and final version id for one article from its versions
+CREATE OR REPLACE FUNCTION refresh_article_has_all_stages()
+RETURNS TRIGGER AS $$
+DECLARE
+    target_article_id UUID;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        target_article_id := OLD.article_id;
+    ELSE
+        target_article_id := NEW.article_id;
+    END IF;
+
+    UPDATE articles
+    SET has_all_stages = (
+            SELECT COUNT(DISTINCT (stage, agent)) = 4
+            FROM article_versions
+            WHERE article_id = target_article_id
+              AND (stage, agent) IN (
+                  ('planning', 'manager'),
+                  ('research', 'researcher'),
+                  ('draft', 'writer'),
+                  ('final', 'editor')
+              )
+        ),
+        final_version_id = (
+            SELECT id
+            FROM article_versions
+            WHERE article_id = target_article_id
+              AND stage = 'final'
+              AND agent = 'editor'
+            ORDER BY created_at DESC
+            LIMIT 1
+        )
+    WHERE id = target_article_id;
+
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- Backfill existing articles
+UPDATE articles a
+SET final_version_id = (
+    SELECT v.id
+    FROM article_versions v
+    WHERE v.article_id = a.id
+      AND v.stage = 'final'
+      AND v.agent = 'editor'
+    ORDER BY v.created_at DESC
+    LIMIT 1
+);
+
+-- Bump articles.updated_at when tags change so page validators see it
+CREATE OR REPLACE FUNCTION touch_article_on_tag_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE articles SET updated_at = NOW() WHERE id = OLD.article_id;
+    ELSE
+        UPDATE articles SET updated_at = NOW() WHERE id = NEW.article_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER touch_article_on_tag_change
+    AFTER INSERT OR DELETE ON article_tags
+    FOR EACH ROW EXECUTE FUNCTION touch_article_on_tag_change();
+
+-- Indexes for the feed and trending topic validators
+CREATE INDEX IF NOT EXISTS idx_articles_published_updated_at ON articles(updated_at DESC)
+    WHERE status = 'completed' AND has_all_stages;
+CREATE INDEX IF NOT EXISTS idx_trending_topics_updated_at ON trending_topics(updated_at DESC);
@@ -0,0 +1,81 @@
+-- Migration 0007: Durable queue for article generation jobs
+-- Run this in Supabase SQL Editor
+
+CREATE TABLE IF NOT EXISTS generation_jobs (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    article_id UUID REFERENCES articles(id) ON DELETE CASCADE,
+    kind VARCHAR(30) NOT NULL DEFAULT 'create_article',
+    payload JSONB NOT NULL DEFAULT '{}',
+    status VARCHAR(20) NOT NULL DEFAULT 'queued', -- queued, running, succeeded, failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    lease_owner VARCHAR(255), -- Worker currently holding the job
+    lease_expires_at TIMESTAMP WITH TIME ZONE,
+    last_error TEXT,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_generation_jobs_ready ON generation_jobs(run_after, created_at)
+    WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_generation_jobs_lease ON generation_jobs(lease_expires_at)
+    WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS idx_generation_jobs_article_id ON generation_jobs(article_id);
+
+CREATE TRIGGER update_generation_jobs_updated_at BEFORE UPDATE ON generation_jobs
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Atomically claim the next ready job (or one whose lease expired) for a worker.
+-- SKIP LOCKED lets any number of workers on any number of hosts poll safely.
+CREATE OR REPLACE FUNCTION claim_generation_job(worker_id TEXT, lease_seconds INTEGER)
+RETURNS SETOF generation_jobs AS $$
+BEGIN
+    -- Jobs whose worker died after using up every attempt are failed, not retried
+    UPDATE generation_jobs
+    SET status = 'failed',
+        last_error = COALESCE(last_error, 'Lease expired'),
+        finished_at = NOW(),
+        lease_owner = NULL,
+        lease_expires_at = NULL
+    WHERE status = 'running'
+      AND lease_expires_at < NOW()
+      AND attempts >= max_attempts;
+
+    RETURN QUERY
+    UPDATE generation_jobs
+    SET status = 'running',
+        lease_owner = worker_id,
+        lease_expires_at = NOW() + make_interval(secs => lease_seconds),
+        attempts = attempts + 1,
+        started_at = COALESCE(started_at, NOW())
+    WHERE id = (
+        SELECT id
+        FROM generation_jobs
+        WHERE (status = 'queued' AND run_after <= NOW())
+           OR (status = 'running' AND lease_expires_at < NOW())
+        ORDER BY run_after, created_at
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING *;
+END;
+$$ language 'plpgsql';
+
+-- Extend a lease; returns false if the worker no longer owns the job
+CREATE OR REPLACE FUNCTION renew_generation_job_lease(job_id UUID, worker_id TEXT, lease_seconds INTEGER)
+RETURNS BOOLEAN AS $$
+BEGIN
+    UPDATE generation_jobs
+    SET lease_expires_at = NOW() + make_interval(secs => lease_seconds)
+    WHERE id = job_id
+      AND status = 'running'
+      AND lease_owner = worker_id;
+    RETURN FOUND;
+END;
+$$ language 'plpgsql';
+
+ALTER TABLE generation_jobs ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow all operations on generation_jobs" ON generation_jobs FOR ALL USING (true);
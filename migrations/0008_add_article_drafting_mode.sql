@@ -0,0 +1,7 @@
+-- Migration 0008: Per-article drafting mode
+-- Run this in Supabase SQL Editor
+
+-- 'single' drafts the whole article in one writer call; 'sections' drafts
+-- outline sections concurrently and stitches them together
+ALTER TABLE articles ADD COLUMN IF NOT EXISTS drafting_mode TEXT NOT NULL DEFAULT 'single'
+    CHECK (drafting_mode IN ('single', 'sections'));
@@ -0,0 +1,8 @@
+-- Migration 0009: Per-stage token counts for context compaction
+-- Run this in Supabase SQL Editor
+
+-- Estimated tokens sent to and returned by the stage's agent calls, and what
+-- the input would have been without compaction
+ALTER TABLE performance_metrics ADD COLUMN IF NOT EXISTS input_tokens INTEGER;
+ALTER TABLE performance_metrics ADD COLUMN IF NOT EXISTS output_tokens INTEGER;
+ALTER TABLE performance_metrics ADD COLUMN IF NOT EXISTS uncompacted_input_tokens INTEGER;
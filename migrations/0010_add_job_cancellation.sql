@@ -0,0 +1,51 @@
+-- Migration 0010: Cooperative cancellation of generation jobs
+-- Run this in Supabase SQL Editor
+
+-- Set by the web tier (pause); the worker running the job polls it and stops.
+-- Jobs that were stopped end in status 'cancelled'.
+ALTER TABLE generation_jobs ADD COLUMN IF NOT EXISTS cancel_requested BOOLEAN NOT NULL DEFAULT FALSE;
+
+CREATE OR REPLACE FUNCTION claim_generation_job(worker_id TEXT, lease_seconds INTEGER)
+RETURNS SETOF generation_jobs AS $$
+BEGIN
+    -- Jobs whose worker died after using up every attempt are failed, not retried
+    UPDATE generation_jobs
+    SET status = 'failed',
+        last_error = COALESCE(last_error, 'Lease expired'),
+        finished_at = NOW(),
+        lease_owner = NULL,
+        lease_expires_at = NULL
+    WHERE status = 'running'
+      AND lease_expires_at < NOW()
+      AND attempts >= max_attempts
+      AND NOT cancel_requested;
+
+    -- Cancelled jobs whose worker died before noticing are not picked up again
+    UPDATE generation_jobs
+    SET status = 'cancelled',
+        finished_at = NOW(),
+        lease_owner = NULL,
+        lease_expires_at = NULL
+    WHERE status = 'running'
+      AND lease_expires_at < NOW()
+      AND cancel_requested;
+
+    RETURN QUERY
+    UPDATE generation_jobs
+    SET status = 'running',
+        lease_owner = worker_id,
+        lease_expires_at = NOW() + make_interval(secs => lease_seconds),
+        attempts = attempts + 1,
+        started_at = COALESCE(started_at, NOW())
+    WHERE id = (
+        SELECT id
+        FROM generation_jobs
+        WHERE (status = 'queued' AND run_after <= NOW())
+           OR (status = 'running' AND lease_expires_at < NOW())
+        ORDER BY run_after, created_at
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING *;
+END;
+$$ language 'plpgsql';
@@ -0,0 +1,18 @@
+-- Migration 0011: Batches of generation jobs submitted from a manifest
+-- Run this in Supabase SQL Editor
+
+CREATE TABLE IF NOT EXISTS generation_batches (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    name VARCHAR(255),
+    total INTEGER NOT NULL DEFAULT 0, -- Number of articles in the manifest
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Jobs keep running if their batch record is removed
+ALTER TABLE generation_jobs ADD COLUMN IF NOT EXISTS batch_id UUID REFERENCES generation_batches(id) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS idx_generation_jobs_batch_id ON generation_jobs(batch_id)
+    WHERE batch_id IS NOT NULL;
+
+ALTER TABLE generation_batches ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow all operations on generation_batches" ON generation_batches FOR ALL USING (true);
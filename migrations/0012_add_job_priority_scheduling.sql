@@ -0,0 +1,78 @@
+-- Migration 0012: Priority classes, weighted fair queuing and deadlines for generation jobs
+-- Run this in Supabase SQL Editor
+
+-- Class (origin:target_length) and weight are set at enqueue time by scheduling.job_priority
+ALTER TABLE generation_jobs ADD COLUMN IF NOT EXISTS priority_class VARCHAR(50) NOT NULL DEFAULT 'manual:medium';
+ALTER TABLE generation_jobs ADD COLUMN IF NOT EXISTS weight DOUBLE PRECISION NOT NULL DEFAULT 1;
+ALTER TABLE generation_jobs ADD COLUMN IF NOT EXISTS deadline TIMESTAMP WITH TIME ZONE;
+
+-- Recent claims per class, for fair shares
+CREATE INDEX IF NOT EXISTS idx_generation_jobs_class_started ON generation_jobs(priority_class, started_at);
+
+DROP FUNCTION IF EXISTS claim_generation_job(TEXT, INTEGER);
+
+-- Claim the next job by priority instead of FIFO:
+--   1. Jobs whose deadline falls within urgent_seconds, earliest deadline first.
+--   2. Otherwise weighted fair queuing across classes: a class's virtual time
+--      is (jobs claimed in the last fair_window_seconds + 1) / weight, and the
+--      class furthest behind its share goes next.
+--   3. Aging: every aging_seconds a job has waited takes one off its virtual
+--      time, so low-weight classes still get served under a long backlog.
+CREATE OR REPLACE FUNCTION claim_generation_job(worker_id TEXT, lease_seconds INTEGER,
+                                                aging_seconds INTEGER DEFAULT 600,
+                                                urgent_seconds INTEGER DEFAULT 1800,
+                                                fair_window_seconds INTEGER DEFAULT 3600)
+RETURNS SETOF generation_jobs AS $$
+BEGIN
+    -- Jobs whose worker died after using up every attempt are failed, not retried
+    UPDATE generation_jobs
+    SET status = 'failed',
+        last_error = COALESCE(last_error, 'Lease expired'),
+        finished_at = NOW(),
+        lease_owner = NULL,
+        lease_expires_at = NULL
+    WHERE status = 'running'
+      AND lease_expires_at < NOW()
+      AND attempts >= max_attempts
+      AND NOT cancel_requested;
+
+    -- Cancelled jobs whose worker died before noticing are not picked up again
+    UPDATE generation_jobs
+    SET status = 'cancelled',
+        finished_at = NOW(),
+        lease_owner = NULL,
+        lease_expires_at = NULL
+    WHERE status = 'running'
+      AND lease_expires_at < NOW()
+      AND cancel_requested;
+
+    RETURN QUERY
+    UPDATE generation_jobs
+    SET status = 'running',
+        lease_owner = worker_id,
+        lease_expires_at = NOW() + make_interval(secs => lease_seconds),
+        attempts = attempts + 1,
+        started_at = COALESCE(started_at, NOW())
+    WHERE id = (
+        WITH service AS (
+            SELECT priority_class, COUNT(*) AS claimed
+            FROM generation_jobs
+            WHERE started_at > NOW() - make_interval(secs => fair_window_seconds)
+            GROUP BY priority_class
+        )
+        SELECT j.id
+        FROM generation_jobs j
+        LEFT JOIN service s ON s.priority_class = j.priority_class
+        WHERE (j.status = 'queued' AND j.run_after <= NOW())
+           OR (j.status = 'running' AND j.lease_expires_at < NOW())
+        ORDER BY
+            CASE WHEN j.deadline <= NOW() + make_interval(secs => urgent_seconds) THEN j.deadline END NULLS LAST,
+            (COALESCE(s.claimed, 0) + 1) / GREATEST(j.weight, 0.01)
+                - EXTRACT(EPOCH FROM (NOW() - j.run_after)) / GREATEST(aging_seconds, 1),
+            j.created_at
+        FOR UPDATE OF j SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING *;
+END;
+$$ language 'plpgsql';
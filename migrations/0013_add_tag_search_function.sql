@@ -0,0 +1,36 @@
+-- Migration 0013: Tag-filtered article search in SQL
+-- Run this in Supabase SQL Editor
+
+-- One keyset page of completed articles having any (or all) of the given tags,
+-- newest first. The tag union/intersection happens here, so neither the full
+-- posting lists nor the matching ids ever travel to the client.
+CREATE OR REPLACE FUNCTION search_articles_by_tags(
+    tag_names TEXT[],
+    match_all BOOLEAN DEFAULT FALSE,
+    search_query TEXT DEFAULT NULL,
+    date_from DATE DEFAULT NULL,
+    date_to DATE DEFAULT NULL,
+    length_filter TEXT DEFAULT NULL,
+    cursor_created_at TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    cursor_id UUID DEFAULT NULL,
+    page_size INTEGER DEFAULT 20
+)
+RETURNS TABLE (id UUID, created_at TIMESTAMP WITH TIME ZONE) AS $$
+    SELECT a.id, a.created_at
+    FROM articles a
+    JOIN article_tags at ON at.article_id = a.id
+    JOIN tags t ON t.id = at.tag_id
+    WHERE t.name = ANY(tag_names)
+      AND a.status = 'completed'
+      AND (search_query IS NULL
+           OR a.title ILIKE '%' || search_query || '%'
+           OR a.prompt ILIKE '%' || search_query || '%')
+      AND (date_from IS NULL OR a.created_at::date >= date_from)
+      AND (date_to IS NULL OR a.created_at::date <= date_to)
+      AND (length_filter IS NULL OR a.target_length = length_filter)
+      AND (cursor_created_at IS NULL OR (a.created_at, a.id) < (cursor_created_at, cursor_id))
+    GROUP BY a.id, a.created_at
+    HAVING NOT match_all OR COUNT(DISTINCT t.name) = cardinality(tag_names)
+    ORDER BY a.created_at DESC, a.id DESC
+    LIMIT page_size;
+$$ LANGUAGE sql STABLE;
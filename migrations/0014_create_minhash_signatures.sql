@@ -0,0 +1,39 @@
+-- Migration 0014: MinHash signatures for near-duplicate detection
+-- Run this in Supabase SQL Editor
+
+-- One signature per article and kind ('prompt' or 'content'). band_keys holds the LSH
+-- bucket of each band ('band:digest'), so a lookup is one GIN array overlap
+-- instead of loading every signature, and adding an article is one upsert.
+-- Rows go away with their article.
+CREATE TABLE IF NOT EXISTS minhash_signatures (
+    article_id UUID NOT NULL REFERENCES articles(id) ON DELETE CASCADE,
+    kind VARCHAR(20) NOT NULL,
+    signature BIGINT[] NOT NULL, -- Unsigned 32-bit hash minima
+    band_keys TEXT[] NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (article_id, kind)
+);
+
+CREATE INDEX IF NOT EXISTS idx_minhash_signatures_band_keys ON minhash_signatures USING GIN (band_keys);
+
+-- Articles of a kind sharing at least one band bucket with the given keys,
+-- those sharing the most buckets first
+CREATE OR REPLACE FUNCTION find_minhash_candidates(
+    signature_kind TEXT,
+    keys TEXT[],
+    exclude_id UUID DEFAULT NULL,
+    max_candidates INTEGER DEFAULT 100
+)
+RETURNS TABLE (article_id UUID, title TEXT, created_at TIMESTAMP WITH TIME ZONE, signature BIGINT[]) AS $$
+    SELECT s.article_id, a.title::TEXT, a.created_at, s.signature
+    FROM minhash_signatures s
+    JOIN articles a ON a.id = s.article_id
+    WHERE s.kind = signature_kind
+      AND s.band_keys && keys
+      AND (exclude_id IS NULL OR s.article_id <> exclude_id)
+    ORDER BY cardinality(ARRAY(SELECT unnest(s.band_keys) INTERSECT SELECT unnest(keys))) DESC
+    LIMIT max_candidates;
+$$ LANGUAGE sql STABLE;
+
+ALTER TABLE minhash_signatures ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow all operations on minhash_signatures" ON minhash_signatures FOR ALL USING (true);
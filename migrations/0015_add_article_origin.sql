@@ -0,0 +1,16 @@
+-- Migration 0015: Remember where each article came from
+-- Run this in Supabase SQL Editor
+
+-- 'manual', 'trending' or 'batch'; resumed jobs reuse it for their scheduling class
+ALTER TABLE articles ADD COLUMN IF NOT EXISTS origin VARCHAR(20) NOT NULL DEFAULT 'manual';
+
+-- Backfill from the class of each article's first job (origin:target_length)
+UPDATE articles a
+SET origin = split_part(j.priority_class, ':', 1)
+FROM (
+    SELECT DISTINCT ON (article_id) article_id, priority_class
+    FROM generation_jobs
+    WHERE article_id IS NOT NULL
+    ORDER BY article_id, created_at
+) j
+WHERE j.article_id = a.id;
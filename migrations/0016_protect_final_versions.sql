@@ -0,0 +1,27 @@
+-- Migration 0016: Don't let deleting a version un-publish its article
+-- Run this in Supabase SQL Editor
+
+-- With ON DELETE SET NULL, deleting an article's current final version
+-- cleared final_version_id (and, with no older final, has_all_stages),
+-- dropping a published article from the feed without any error.
+-- Refuse that delete instead; deleting the whole article still cascades,
+-- since the article row is gone by the time its versions are removed.
+ALTER TABLE articles DROP CONSTRAINT IF EXISTS articles_final_version_id_fkey;
+ALTER TABLE articles ADD CONSTRAINT articles_final_version_id_fkey
+    FOREIGN KEY (final_version_id) REFERENCES article_versions(id) ON DELETE RESTRICT;
+
+CREATE OR REPLACE FUNCTION protect_final_article_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM articles WHERE final_version_id = OLD.id) THEN
+        RAISE EXCEPTION 'Version % is the final version of article %; delete the article or add a newer final version first',
+            OLD.id, OLD.article_id;
+    END IF;
+    RETURN OLD;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS protect_final_article_version ON article_versions;
+CREATE TRIGGER protect_final_article_version
+    BEFORE DELETE ON article_versions
+    FOR EACH ROW EXECUTE FUNCTION protect_final_article_version();
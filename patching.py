@@ -0,0 +1,53 @@
+import json
+import re
+from typing import Dict, List
+
+class PatchError(ValueError):
+    """Raised when an editor's edits can't be parsed or applied to the draft"""
+
+def parse_edits(content: str) -> List[Dict[str, str]]:
+    """
+    Parse an editor response of the form {"edits": [{"find": ..., "replace": ...}]}.
+
+    The JSON may be wrapped in a ```json fence or surrounded by prose.
+    """
+    match = re.search(r'```(?:json)?\s*(\{.*\})\s*```', content, re.DOTALL) or re.search(r'(\{.*\})', content, re.DOTALL)
+    if not match:
+        raise PatchError("No JSON object in editor response")
+    try:
+        data = json.loads(match.group(1))
+    except ValueError as e:
+        raise PatchError(f"Invalid edit JSON: {str(e)}")
+
+    edits = data.get('edits') if isinstance(data, dict) else None
+    if not isinstance(edits, list):
+        raise PatchError("Editor response has no 'edits' list")
+    for edit in edits:
+        if not isinstance(edit, dict) or not isinstance(edit.get('find'), str) or not isinstance(edit.get('replace'), str):
+            raise PatchError(f"Malformed edit: {edit!r}")
+        if not edit['find']:
+            raise PatchError("Edit with an empty 'find'")
+    return edits
+
+def _locate(text: str, find: str) -> re.Match:
+    """Find one occurrence of a snippet, tolerating differences in whitespace"""
+    pattern = r'\s+'.join(re.escape(part) for part in find.split())
+    matches = list(re.finditer(pattern, text))
+    if not matches:
+        raise PatchError(f"Edit target not found: {find[:80]!r}")
+    if len(matches) > 1:
+        raise PatchError(f"Edit target is ambiguous ({len(matches)} matches): {find[:80]!r}")
+    return matches[0]
+
+def apply_edits(draft: str, edits: List[Dict[str, str]]) -> str:
+    """
+    Apply find/replace edits to a draft, in order.
+
+    Every 'find' must match exactly one place in the text (whitespace may
+    differ); otherwise nothing is applied and PatchError is raised.
+    """
+    text = draft
+    for edit in edits:
+        match = _locate(text, edit['find'])
+        text = text[:match.start()] + edit['replace'] + text[match.end():]
+    return text
@@ -0,0 +1,319 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+from cancellation import cancellable
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class RateLimitBudgetExhausted(Exception):
+    """Raised by non-blocking callers when the shared limiter has no budget right now"""
+
+    def __init__(self, wait_seconds: float):
+        super().__init__(f"No rate limit budget for another {wait_seconds:.1f}s")
+        self.wait_seconds = wait_seconds
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting (about four characters per token)"""
+    return max(1, len(text or '') // 4)
+
+_STATUS_429 = re.compile(r"\b(?:status(?:[ _]?code)?|code|HTTP(?:/[\d.]+)?)['\"]?\s*[:=]?\s*['\"]?429\b", re.IGNORECASE)
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Whether an exception from the Gemini client means we hit a rate limit"""
+    for attribute in ('code', 'status_code', 'status'):
+        if getattr(error, attribute, None) in (429, '429', 'RESOURCE_EXHAUSTED'):
+            return True
+    if type(error).__name__ in ('ResourceExhausted', 'TooManyRequests'):
+        return True
+    message = str(error)
+    if 'Too Many Requests' in message or 'RESOURCE_EXHAUSTED' in message:
+        return True
+    # Only a 429 given as a status code: the digits alone also turn up in IDs, token counts and URLs
+    return _STATUS_429.search(message) is not None
+
+def retry_after_from_error(error: Exception) -> Optional[float]:
+    """
+    Extract a server retry hint, in seconds, from a rate limit error.
+
+    Understands a Retry-After header on an attached response, the
+    RetryInfo 'retryDelay' field and 'retry in Ns' phrasing in the message.
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers:
+        retry_after = headers.get('retry-after') or headers.get('Retry-After')
+        try:
+            if retry_after is not None:
+                return float(retry_after)
+        except ValueError:
+            pass
+
+    message = str(error)
+    match = re.search(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", message)
+    if not match:
+        match = re.search(r'retry in (\d+(?:\.\d+)?)\s*s', message, re.IGNORECASE)
+    if match:
+        return float(match.group(1))
+    return None
+
+class MemoryBucketStore:
+    """Keeps limiter state in this process only"""
+
+    def __init__(self):
+        self._state: Dict = {}
+        self._lock = threading.Lock()
+
+    def transact(self, update: Callable[[Dict], Tuple[Dict, float]]) -> float:
+        """Apply an update to the state atomically and return its result"""
+        with self._lock:
+            self._state, result = update(dict(self._state))
+            return result
+
+class FileBucketStore:
+    """
+    Keeps limiter state in a JSON file guarded by an exclusive lock.
+
+    Every process on the host that points at the same file shares one budget.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def transact(self, update: Callable[[Dict], Tuple[Dict, float]]) -> float:
+        """Apply an update to the state atomically and return its result"""
+        with self._lock:
+            with open(self.path, 'a+') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    raw = f.read()
+                    try:
+                        state = json.loads(raw) if raw else {}
+                    except ValueError:
+                        logger.warning(f"Resetting unreadable rate limit state in {self.path}")
+                        state = {}
+                    state, result = update(state)
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                    return result
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+class RateLimiter:
+    """
+    Token-bucket limiter for requests-per-minute and tokens-per-minute budgets.
+
+    Both buckets refill continuously and hold at most one minute of budget.
+    A call is admitted only when both buckets can cover it, so callers run at
+    the full allowed rate instead of sleeping a fixed interval. After a call,
+    record_usage() reconciles the estimate with what the API actually used.
+
+    The configured budgets are a ceiling. An AIMD controller scales the
+    effective rate: each success adds a small fixed step (additive increase)
+    and each rate-limit error halves it (multiplicative decrease) and pauses
+    every caller for the server's retry hint. The rate therefore settles at
+    the highest level our key actually sustains.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, store=None,
+                 increase_step: float = 0.02, decrease_factor: float = 0.5, min_scale: float = 0.05):
+        self.requests_per_minute = float(requests_per_minute)
+        self.tokens_per_minute = float(tokens_per_minute)
+        self.store = store or MemoryBucketStore()
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.min_scale = min_scale
+
+    @classmethod
+    def from_env(cls) -> 'RateLimiter':
+        """Build a limiter from GEMINI_RPM, GEMINI_TPM and RATE_LIMIT_STATE_FILE"""
+        state_file = os.getenv('RATE_LIMIT_STATE_FILE')
+        return cls(
+            requests_per_minute=float(os.getenv('GEMINI_RPM', '15')),
+            tokens_per_minute=float(os.getenv('GEMINI_TPM', '1000000')),
+            store=FileBucketStore(state_file) if state_file else MemoryBucketStore()
+        )
+
+    def _refill(self, state: Dict, now: float) -> Dict:
+        if 'updated_at' not in state:
+            return {
+                'requests': self.requests_per_minute,
+                'tokens': self.tokens_per_minute,
+                'scale': 1.0,
+                'blocked_until': 0.0,
+                'updated_at': now
+            }
+        scale = state.get('scale', 1.0)
+        request_capacity = self.requests_per_minute * scale
+        token_capacity = self.tokens_per_minute * scale
+        elapsed = max(0.0, now - state['updated_at'])
+        return {
+            'requests': min(request_capacity, state['requests'] + elapsed * request_capacity / 60),
+            'tokens': min(token_capacity, state['tokens'] + elapsed * token_capacity / 60),
+            'scale': scale,
+            'blocked_until': state.get('blocked_until', 0.0),
+            'updated_at': now
+        }
+
+    def current_rate(self) -> float:
+        """Effective requests per minute after AIMD scaling"""
+        return self.store.transact(
+            lambda state: (state, self._refill(state, time.time())['scale'] * self.requests_per_minute)
+        )
+
+    def on_success(self) -> None:
+        """Additive increase after a call that was not rate limited"""
+        def update(state):
+            state = self._refill(state, time.time())
+            state['scale'] = min(1.0, state['scale'] + self.increase_step)
+            return state, 0.0
+
+        self.store.transact(update)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> float:
+        """
+        Multiplicative decrease after a rate-limit error.
+
+        Every caller sharing the limiter pauses until the server's retry hint
+        (or one interval at the reduced rate if there is none) has passed.
+
+        Returns:
+            Seconds until calls are admitted again
+        """
+        def update(state):
+            now = time.time()
+            state = self._refill(state, now)
+            state['scale'] = max(self.min_scale, state['scale'] * self.decrease_factor)
+            state['requests'] = 0.0
+            if retry_after is None:
+                pause = 60 / (self.requests_per_minute * state['scale'])
+            else:
+                pause = retry_after
+            pause += random.uniform(0, 1)  # Spread out callers resuming together
+            state['blocked_until'] = max(state['blocked_until'], now + pause)
+            return state, state['blocked_until'] - now
+
+        pause = self.store.transact(update)
+        logger.warning(f"Rate limited: reduced to {self.current_rate():.1f} requests/min, pausing {pause:.1f}s")
+        return pause
+
+    def try_acquire(self, tokens: int = 0, requests: int = 1) -> float:
+        """
+        Take budget for one call if available.
+
+        Args:
+            tokens: Estimated tokens the call will use
+            requests: Number of API requests the call will make
+
+        Returns:
+            0 if the budget was taken, otherwise seconds to wait before retrying
+        """
+        def update(state):
+            now = time.time()
+            state = self._refill(state, now)
+            if state['blocked_until'] > now:
+                return state, state['blocked_until'] - now
+
+            # A single call can never need more than a full bucket
+            request_rate = self.requests_per_minute * state['scale']
+            token_rate = self.tokens_per_minute * state['scale']
+            needed_requests = min(requests, request_rate)
+            needed_tokens = min(tokens, token_rate)
+            if state['requests'] >= needed_requests and state['tokens'] >= needed_tokens:
+                state['requests'] -= needed_requests
+                state['tokens'] -= needed_tokens
+                return state, 0.0
+            request_wait = (needed_requests - state['requests']) * 60 / request_rate
+            token_wait = (needed_tokens - state['tokens']) * 60 / token_rate
+            return state, max(request_wait, token_wait, 0.01)
+
+        return self.store.transact(update)
+
+    async def acquire(self, tokens: int = 0, requests: int = 1) -> None:
+        """Wait (without blocking the event loop) until the call fits the budget"""
+        while True:
+            wait = self.try_acquire(tokens, requests)
+            if wait <= 0:
+                return
+            logger.debug(f"Rate limiter waiting {wait:.2f}s")
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, tokens: int = 0, requests: int = 1) -> None:
+        """Blocking variant of acquire() for synchronous callers"""
+        while True:
+            wait = self.try_acquire(tokens, requests)
+            if wait <= 0:
+                return
+            logger.debug(f"Rate limiter waiting {wait:.2f}s")
+            time.sleep(wait)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int],
+                     estimated_requests: int = 1, actual_requests: Optional[int] = None) -> None:
+        """
+        Correct the buckets once actual usage is known.
+
+        Using more than estimated puts the bucket into debt, which delays
+        later calls; using less hands the difference back.
+        """
+        token_delta = (actual_tokens - estimated_tokens) if actual_tokens is not None else 0
+        request_delta = (actual_requests - estimated_requests) if actual_requests is not None else 0
+        if not token_delta and not request_delta:
+            return
+
+        def update(state):
+            state = self._refill(state, time.time())
+            state['tokens'] = min(self.tokens_per_minute * state['scale'], state['tokens'] - token_delta)
+            state['requests'] = min(self.requests_per_minute * state['scale'], state['requests'] - request_delta)
+            return state, 0.0
+
+        self.store.transact(update)
+
+async def call_with_rate_limit(func, rate_limiter: RateLimiter, max_retries: int = 5):
+    """
+    Run an async call, feeding rate-limit outcomes back into the AIMD controller.
+
+    Rate-limit errors shrink the shared rate and wait out the server's retry
+    hint before trying again. Other errors are raised immediately.
+
+    Args:
+        func: Async function making one API call (it should acquire budget itself)
+        rate_limiter: Limiter to report successes and rate-limit errors to
+        max_retries: Maximum number of attempts
+    """
+    for attempt in range(max_retries):
+        try:
+            result = await func()
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == max_retries - 1:
+                raise
+            pause = rate_limiter.on_rate_limited(retry_after_from_error(e))
+            # The pause can run to tens of seconds; a paused or deleted job shouldn't sit it out
+            await cancellable(asyncio.sleep(pause))
+            continue
+        rate_limiter.on_success()
+        return result
+
+_shared_limiter: Optional[RateLimiter] = None
+_shared_limiter_lock = threading.Lock()
+
+def get_rate_limiter() -> RateLimiter:
+    """The process-wide Gemini limiter shared by the agents and TagGenerator"""
+    global _shared_limiter
+    with _shared_limiter_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter.from_env()
+        return _shared_limiter
@@ -0,0 +1,62 @@
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+def _weights_from_env(name: str, defaults: Dict[str, float]) -> Dict[str, float]:
+    """Parse weights like 'trending=4,manual=2' from the environment over the defaults"""
+    weights = dict(defaults)
+    for item in os.getenv(name, '').split(','):
+        key, _, value = item.partition('=')
+        if key.strip() and value.strip():
+            weights[key.strip()] = float(value)
+    return weights
+
+# Share of workers each kind of job gets under backlog. A job's weight is its
+# origin weight times its length weight, so trending and short articles are
+# served more often without starving anything.
+ORIGIN_WEIGHTS = _weights_from_env('SCHEDULER_ORIGIN_WEIGHTS', {'trending': 4, 'manual': 2, 'batch': 1})
+LENGTH_WEIGHTS = _weights_from_env('SCHEDULER_LENGTH_WEIGHTS', {'short': 3, 'medium': 2, 'long': 1})
+
+# Publishing deadline given to jobs of an origin unless the caller sets one
+DEFAULT_DEADLINE_MINUTES = {
+    'trending': int(os.getenv('SCHEDULER_TRENDING_DEADLINE_MINUTES', '120'))
+}
+
+def priority_class(origin: str, target_length: str) -> str:
+    return f"{origin}:{target_length}"
+
+def job_priority(origin: str, target_length: str, deadline: Optional[datetime] = None) -> Dict:
+    """
+    Scheduling fields for a generation job.
+
+    Args:
+        origin: Where the article came from ('manual', 'trending' or 'batch')
+        target_length: The article's target length
+        deadline: When the article should be published by; defaults per origin
+
+    Returns:
+        priority_class, weight and deadline columns for the job row
+    """
+    if deadline is None and origin in DEFAULT_DEADLINE_MINUTES:
+        deadline = datetime.utcnow() + timedelta(minutes=DEFAULT_DEADLINE_MINUTES[origin])
+    return {
+        'priority_class': priority_class(origin, target_length),
+        'weight': ORIGIN_WEIGHTS.get(origin, 1) * LENGTH_WEIGHTS.get(target_length, 1),
+        'deadline': deadline.isoformat() if deadline else None
+    }
+
+def claim_settings() -> Dict[str, int]:
+    """
+    Parameters claim_generation_job uses to pick the next job.
+
+    aging_seconds: waiting this long counts as much as one job of
+        fair share, so low-weight classes are never starved
+    urgent_seconds: jobs whose deadline is this close jump the queue,
+        earliest deadline first
+    fair_window_seconds: how far back claims count towards a class's share
+    """
+    return {
+        'aging_seconds': int(os.getenv('SCHEDULER_AGING_SECONDS', '600')),
+        'urgent_seconds': int(os.getenv('SCHEDULER_URGENT_SECONDS', '1800')),
+        'fair_window_seconds': int(os.getenv('SCHEDULER_FAIR_WINDOW_SECONDS', '3600'))
+    }
@@ -0,0 +1,514 @@
+import fcntl
+import gzip
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'for', 'from', 'has', 'have',
+    'how', 'in', 'into', 'is', 'it', 'its', 'of', 'on', 'or', 'that', 'the', 'their',
+    'this', 'to', 'was', 'were', 'what', 'when', 'which', 'with', 'will', 'www', 'http', 'https'
+}
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase, lightly stemmed terms, dropping stopwords and link targets"""
+    text = re.sub(r'\]\([^)]*\)', ']', text or '')  # Markdown link targets
+    text = re.sub(r'https?://\S+', ' ', text)  # Bare URLs
+    terms = []
+    for token in re.findall(r'[a-z0-9]+', text.lower()):
+        if token in STOPWORDS or len(token) < 2:
+            continue
+        terms.append(_stem(token))
+    return terms
+
+def _stem(token: str) -> str:
+    """Very light plural stemming so 'models' matches 'model'"""
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+def normalize_phrase(text: str) -> str:
+    """Lowercase and collapse punctuation/whitespace for prefix matching"""
+    return ' '.join(re.findall(r'[a-z0-9]+', (text or '').lower()))
+
+class PrefixIndex:
+    """
+    Sorted-array prefix index for autocomplete over titles and tag names.
+
+    Every title is indexed under its full text and under each later word, so
+    'comp' finds 'Quantum Computing Advances'. Lookups are a binary search
+    plus a short scan of the matching range.
+    """
+
+    # Ranking of match kinds: title starts with the prefix, tag, later title word
+    TITLE_START, TAG, TITLE_WORD = 0, 1, 2
+
+    def __init__(self, titles: List[str], tags: List[str]):
+        entries = set()
+        for title in titles:
+            words = normalize_phrase(title).split()
+            for position in range(len(words)):
+                kind = self.TITLE_START if position == 0 else self.TITLE_WORD
+                entries.add((' '.join(words[position:]), kind, title))
+        for tag in tags:
+            entries.add((normalize_phrase(tag), self.TAG, tag))
+        self._entries = sorted(entry for entry in entries if entry[0])
+        self._keys = [entry[0] for entry in self._entries]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def suggest(self, prefix: str, limit: int = 10, scan_limit: int = 500) -> List[str]:
+        """
+        Returns up to limit suggestions whose title or tag starts with prefix.
+
+        Args:
+            prefix: What the user has typed so far
+            limit: Maximum suggestions to return
+            scan_limit: Maximum index entries to consider for very short prefixes
+        """
+        prefix = normalize_phrase(prefix)
+        if not prefix:
+            return []
+
+        matches = []
+        position = bisect_left(self._keys, prefix)
+        while position < len(self._keys) and len(matches) < scan_limit:
+            key, kind, label = self._entries[position]
+            if not key.startswith(prefix):
+                break
+            matches.append((kind, len(label), label))
+            position += 1
+
+        suggestions = []
+        for _, _, label in sorted(matches):
+            if label not in suggestions:
+                suggestions.append(label)
+            if len(suggestions) >= limit:
+                break
+        return suggestions
+
+class SearchIndex:
+    """
+    Inverted index over published articles with BM25 ranking.
+
+    Title, tags and final editor content are indexed with field weights
+    (BM25F-style). The index is persisted as a gzip-compressed JSON file;
+    writers take an exclusive file lock and merge into the latest copy on
+    disk, and readers reload whenever the file changes, so processes on one
+    host can share one index.
+
+    Processes that don't share a disk with the workers (e.g. the web service
+    on Render) call sync(), which compares the published feed's fingerprint
+    with the one the index was built from and catches up from the database.
+    A missing or inconsistent index is rebuilt in a background thread, while
+    the old copy keeps serving; it can also be rebuilt ahead of time with
+    `python search_index.py --rebuild`.
+    """
+
+    FIELD_WEIGHTS = {'title': 3, 'tags': 2, 'content': 1}
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75, load: bool = True):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._mtime = None
+        self._generation = 0
+        self._prefix_index: Optional[PrefixIndex] = None
+        self._prefix_generation = -1
+        self._tag_postings: Dict[str, set] = {}
+        self._tag_generation = -1
+        self._last_sync = 0.0
+        self._rebuild_thread: Optional[threading.Thread] = None
+        self._reset()
+        if load:
+            self.reload_if_changed()
+
+    def _reset(self) -> None:
+        self._generation += 1
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.doc_lengths: Dict[str, float] = {}
+        self.docs: Dict[str, Dict] = {}
+        # (published count, latest updated_at) the index reflects; see sync()
+        self.feed_state: Optional[List] = None
+
+    def __len__(self) -> int:
+        self.reload_if_changed()
+        return len(self.docs)
+
+    # ===== INDEXING =====
+
+    def add_document(self, article_id: str, title: str, content: str, tags: Optional[List[str]] = None,
+                     created_at: Optional[str] = None, target_length: Optional[str] = None) -> None:
+        """Indexes (or re-indexes) one article and persists the index"""
+        with self.update():
+            self._add(article_id, title, content, tags or [], created_at, target_length)
+            # Not yet in feed_state's count; the next sync counts it as new
+            self.docs[article_id]['unsynced'] = True
+
+    def remove_document(self, article_id: str) -> None:
+        """
+        Removes one article from the index and persists the index.
+
+        A removed article that the feed count includes is taken off it, so
+        a delete is accounted for without sync() having to rebuild.
+        """
+        with self.update():
+            doc = self.docs.get(article_id)
+            self._remove(article_id)
+            if doc and not doc.get('unsynced') and self.feed_state:
+                self.feed_state[0] -= 1
+
+    def _add(self, article_id: str, title: str, content: str, tags: List[str],
+             created_at: Optional[str], target_length: Optional[str]) -> None:
+        self._remove(article_id)
+        self._generation += 1
+
+        weighted = Counter()
+        for term in tokenize(title):
+            weighted[term] += self.FIELD_WEIGHTS['title']
+        for term in tokenize(' '.join(tags)):
+            weighted[term] += self.FIELD_WEIGHTS['tags']
+        for term in tokenize(content):
+            weighted[term] += self.FIELD_WEIGHTS['content']
+
+        for term, tf in weighted.items():
+            self.postings.setdefault(term, {})[article_id] = tf
+        self.doc_lengths[article_id] = float(sum(weighted.values()))
+        self.docs[article_id] = {
+            'title': title,
+            'tags': [tag.lower() for tag in tags],
+            'terms': sorted(weighted),
+            'created_at': created_at,
+            'target_length': target_length
+        }
+
+    def _remove(self, article_id: str) -> None:
+        doc = self.docs.pop(article_id, None)
+        self.doc_lengths.pop(article_id, None)
+        if not doc:
+            return
+        self._generation += 1
+        for term in doc['terms']:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(article_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    # ===== QUERYING =====
+
+    def search(self, query: str, tags: Optional[List[str]] = None, date_from: Optional[str] = None,
+               date_to: Optional[str] = None, target_length: Optional[str] = None,
+               tag_mode: str = 'any') -> List[Tuple[str, float]]:
+        """
+        Ranks indexed articles against a query with BM25.
+
+        Args:
+            query: Free-text query
+            tags: Only keep articles having these tags
+            tag_mode: 'any' to match any of the tags, 'all' to require every tag
+            date_from: Only keep articles created on or after this ISO date
+            date_to: Only keep articles created on or before this ISO date
+            target_length: Only keep articles of this target length
+
+        Returns:
+            List of (article_id, score), best match first
+        """
+        self.reload_if_changed()
+        with self._lock:
+            terms = set(tokenize(query))
+            if not terms or not self.docs:
+                return []
+
+            doc_count = len(self.docs)
+            avg_length = sum(self.doc_lengths.values()) / doc_count
+            scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for article_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[article_id] / avg_length)
+                    scores[article_id] = scores.get(article_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            allowed_ids = self.match_tags(tags, tag_mode) if tags else None
+            results = []
+            for article_id, score in scores.items():
+                if allowed_ids is not None and article_id not in allowed_ids:
+                    continue
+                doc = self.docs[article_id]
+                if target_length and doc.get('target_length') != target_length:
+                    continue
+                created_day = (doc.get('created_at') or '')[:10]
+                if date_from and created_day < date_from[:10]:
+                    continue
+                if date_to and created_day > date_to[:10]:
+                    continue
+                results.append((article_id, score))
+
+            results.sort(key=lambda item: (-item[1], item[0]))
+            return results
+
+    def match_tags(self, tags: List[str], tag_mode: str = 'any') -> set:
+        """
+        Resolves a tag filter to article IDs using precomputed tag posting lists.
+
+        Args:
+            tags: Tag names
+            tag_mode: 'any' unions the posting lists, 'all' intersects them
+        """
+        if tag_mode not in ('any', 'all'):
+            raise ValueError(f"Invalid tag mode '{tag_mode}'. Must be 'any' or 'all'")
+        with self._lock:
+            if self._tag_generation != self._generation:
+                postings: Dict[str, set] = {}
+                for article_id, doc in self.docs.items():
+                    for tag in doc['tags']:
+                        postings.setdefault(tag, set()).add(article_id)
+                self._tag_postings = postings
+                self._tag_generation = self._generation
+            lists = [self._tag_postings.get(tag.lower().strip(), set()) for tag in tags]
+        if not lists:
+            return set()
+        if tag_mode == 'all':
+            return set.intersection(*lists)
+        return set.union(*lists)
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[str]:
+        """
+        Autocomplete suggestions (titles and tag names) for a typed prefix.
+
+        The prefix index is rebuilt from the indexed documents only when they
+        change, e.g. after an article completes, and never touches the database.
+        """
+        self.reload_if_changed()
+        with self._lock:
+            if self._prefix_generation != self._generation:
+                titles = [doc['title'] for doc in self.docs.values()]
+                tags = sorted({tag for doc in self.docs.values() for tag in doc['tags']})
+                self._prefix_index = PrefixIndex(titles, tags)
+                self._prefix_generation = self._generation
+            prefix_index = self._prefix_index
+        return prefix_index.suggest(prefix, limit)
+
+    # ===== PERSISTENCE =====
+
+    @contextmanager
+    def update(self):
+        """
+        Context manager for a cross-process index update.
+
+        Holds an exclusive lock file, reloads the on-disk copy so concurrent
+        writers don't lose each other's changes, then saves on exit.
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with self._lock:
+                    self.reload_if_changed()
+                    yield self
+                    self._save()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def reload_if_changed(self) -> None:
+        """Reloads the index from disk if another process has saved a newer copy"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            try:
+                with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                    data = json.load(f)
+            except Exception as e:
+                logger.error(f"Failed to load search index {self.path}: {str(e)}")
+                return
+            self.postings = data['postings']
+            self.doc_lengths = data['doc_lengths']
+            self.docs = data['docs']
+            self.feed_state = data.get('feed_state')
+            self._mtime = mtime
+            self._generation += 1
+
+    def _save(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        data = {'postings': self.postings, 'doc_lengths': self.doc_lengths, 'docs': self.docs,
+                'feed_state': self.feed_state}
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                    f.write(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    # ===== BUILDING =====
+
+    def rebuild(self, db) -> int:
+        """
+        Rebuilds the whole index from the published articles in the database.
+
+        The new index is built into a separate SearchIndex without holding
+        the file lock, and only replaces this one once it is complete, so a
+        failed rebuild leaves the current index as it was.
+
+        Args:
+            db: Database instance
+
+        Returns:
+            Number of articles indexed
+        """
+        fresh = SearchIndex(self.path, self.k1, self.b, load=False)
+        fresh._build(db)
+        with self.update():
+            self.postings = fresh.postings
+            self.doc_lengths = fresh.doc_lengths
+            self.docs = fresh.docs
+            self.feed_state = fresh.feed_state
+            self._generation += 1
+        logger.info(f"Rebuilt search index with {len(fresh.docs)} articles")
+        return len(fresh.docs)
+
+    def rebuild_in_background(self, db) -> bool:
+        """Starts a rebuild in a daemon thread unless one is already running; returns True if started"""
+        with self._lock:
+            if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+                return False
+            self._rebuild_thread = threading.Thread(target=self._rebuild_quietly, args=(db,),
+                                                    name='search-index-rebuild', daemon=True)
+            self._rebuild_thread.start()
+            return True
+
+    def _rebuild_quietly(self, db) -> None:
+        try:
+            self.rebuild(db)
+        except Exception as e:
+            logger.error(f"Search index rebuild failed: {str(e)}")
+
+    def sync(self, db, min_interval: float = 60) -> bool:
+        """
+        Catches the index up with articles published by other processes.
+
+        At most once per min_interval, compares the published feed's
+        fingerprint (db.get_published_feed_state) with the one the index was
+        built from. Newly completed or updated articles are added
+        incrementally. A missing index, or one whose counts no longer add up
+        because articles left the feed without remove_document, is rebuilt
+        in the background; the request that noticed never waits for it.
+
+        Returns:
+            True if the index was updated (or a rebuild was started)
+        """
+        now = time.monotonic()
+        if now - self._last_sync < min_interval:
+            return False
+        self._last_sync = now
+        if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+            return False
+
+        self.reload_if_changed()
+        state = list(db.get_published_feed_state())
+        if state == self.feed_state:
+            return False
+        if not self.feed_state or not self.feed_state[1]:
+            return self.rebuild_in_background(db)
+
+        with self.update():
+            # Another process may have caught up while we waited for the lock
+            if state == self.feed_state:
+                return False
+
+            since = self.feed_state[1]
+            new_ids = set()
+            while True:
+                articles = db.get_published_articles_updated_since(since)
+                for article in articles:
+                    doc = self.docs.get(article['id'])
+                    if doc is None or doc.get('unsynced'):
+                        new_ids.add(article['id'])
+                    self._add_published(db, article)
+                    if article['id'] in new_ids and article['id'] in self.docs:
+                        # Stays uncounted until feed_state moves past it
+                        self.docs[article['id']]['unsynced'] = True
+                if len(articles) < db.MAX_PAGE_SIZE or articles[-1]['updated_at'] == since:
+                    break
+                since = articles[-1]['updated_at']
+
+            # Counts only add up if nothing left the feed unnoticed since the last sync
+            consistent = self.feed_state[0] + len(new_ids) == state[0]
+            if consistent:
+                self.feed_state = state
+                for article_id in new_ids:
+                    self.docs.get(article_id, {}).pop('unsynced', None)
+        if not consistent:
+            self.rebuild_in_background(db)
+        logger.info(f"Synced search index to {len(self.docs)} articles")
+        return True
+
+    def _build(self, db) -> None:
+        # Fingerprint first, so anything published mid-rebuild is caught by the next sync
+        feed_state = list(db.get_published_feed_state())
+        cursor = None
+        while True:
+            articles, cursor = db.get_published_articles(limit=db.MAX_PAGE_SIZE, cursor=cursor)
+            for article in articles:
+                self._add_published(db, article)
+            if not cursor:
+                break
+        self.feed_state = feed_state
+
+    def _add_published(self, db, article: Dict) -> None:
+        final_version = db.get_article_version(article['final_version_id']) if article.get('final_version_id') else None
+        if not final_version:
+            logger.warning(f"Skipping article {article['id']}: no final version")
+            return
+        self._add(
+            article['id'],
+            article['title'],
+            final_version['content'],
+            [tag['name'] for tag in article['tags']],
+            article['created_at'],
+            article['target_length']
+        )
+
+if __name__ == '__main__':
+    import sys
+    from dotenv import load_dotenv
+    from database import Database
+
+    load_dotenv()
+    if len(sys.argv) != 2 or sys.argv[1] != '--rebuild':
+        print("Usage: python search_index.py --rebuild")
+        sys.exit(1)
+
+    db = Database(url=os.getenv('SUPABASE_URL'), key=os.getenv('SUPABASE_KEY'))
+    index = SearchIndex(os.getenv('SEARCH_INDEX_PATH', 'data/search_index.json.gz'))
+    count = index.rebuild(db)
+    print(f"Indexed {count} articles into {index.path}")
@@ -0,0 +1,143 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from agno.tools.duckduckgo import DuckDuckGoTools
+from agno.tools.newspaper4k import Newspaper4kTools
+from cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that never change what a page says
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid', 'ref', 'ref_src', 'igshid'}
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalize a URL so the same page fetched through different links shares one entry.
+
+    Lowercases the scheme and host, drops 'www.', default ports, fragments,
+    tracking parameters and trailing slashes, and sorts the query string.
+    """
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or 'http').lower()
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if parts.port and not (scheme == 'http' and parts.port == 80) and not (scheme == 'https' and parts.port == 443):
+        host = f"{host}:{parts.port}"
+    path = re.sub(r'/{2,}', '/', parts.path or '/')
+    if len(path) > 1:
+        path = path.rstrip('/')
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+def normalize_query(query: str) -> str:
+    """Collapse case and whitespace so trivially different searches share an entry"""
+    return ' '.join(query.lower().split())
+
+class SourceStore:
+    """
+    Local store of research sources shared by every article's research step.
+
+    Search results are keyed by the normalized query. Parsed pages are keyed
+    by canonical URL and point at a body stored by its SHA-256, so mirrors and
+    syndicated copies of the same text are stored once. Everything is gzip
+    JSON on disk (see DiskCache), with separate TTLs for searches, which go
+    stale quickly, and pages, which rarely change.
+    """
+
+    def __init__(self, directory: str, search_ttl: float = 24 * 3600, page_ttl: float = 7 * 24 * 3600,
+                 max_bytes: int = 512 * 1024 * 1024):
+        self.searches = DiskCache(os.path.join(directory, 'searches'), max_bytes=max_bytes // 8, ttl=search_ttl)
+        self.pages = DiskCache(os.path.join(directory, 'pages'), max_bytes=max_bytes // 8, ttl=page_ttl)
+        self.bodies = DiskCache(os.path.join(directory, 'bodies'), max_bytes=max_bytes * 3 // 4, ttl=page_ttl)
+
+    @classmethod
+    def from_env(cls) -> Optional['SourceStore']:
+        """Build the store from SOURCE_CACHE_* settings; None when SOURCE_CACHE_DIR is ''"""
+        directory = os.getenv('SOURCE_CACHE_DIR', 'data/source_cache')
+        if not directory:
+            return None
+        return cls(
+            directory,
+            search_ttl=float(os.getenv('SOURCE_CACHE_SEARCH_TTL', str(24 * 3600))),
+            page_ttl=float(os.getenv('SOURCE_CACHE_PAGE_TTL', str(7 * 24 * 3600))),
+            max_bytes=int(os.getenv('SOURCE_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+        )
+
+    def __deepcopy__(self, memo):
+        # Agents are copied per run; they should all keep sharing one store
+        return self
+
+    def get_search(self, kind: str, query: str, options: dict) -> Optional[str]:
+        return self.searches.get(self._search_key(kind, query, options))
+
+    def set_search(self, kind: str, query: str, options: dict, results: str) -> None:
+        self.searches.set(self._search_key(kind, query, options), results)
+
+    def get_page(self, url: str) -> Optional[str]:
+        entry = self.pages.get(canonicalize_url(url))
+        if entry is None:
+            return None
+        return self.bodies.get(entry['hash'])
+
+    def set_page(self, url: str, body: str) -> None:
+        digest = hashlib.sha256(body.encode('utf-8')).hexdigest()
+        if self.bodies.get(digest) is None:
+            self.bodies.set(digest, body)
+        self.pages.set(canonicalize_url(url), {'hash': digest})
+
+    @staticmethod
+    def _search_key(kind: str, query: str, options: dict) -> str:
+        return json.dumps([kind, normalize_query(query), sorted(options.items())])
+
+class CachedDuckDuckGoTools(DuckDuckGoTools):
+    """DuckDuckGoTools that answers repeated searches from a SourceStore"""
+
+    def __init__(self, store: SourceStore, **kwargs):
+        self.store = store
+        super().__init__(**kwargs)
+
+    @functools.wraps(DuckDuckGoTools.duckduckgo_search)
+    def duckduckgo_search(self, query: str, **kwargs) -> str:
+        return self._cached('search', super().duckduckgo_search, query, kwargs)
+
+    @functools.wraps(DuckDuckGoTools.duckduckgo_news)
+    def duckduckgo_news(self, query: str, **kwargs) -> str:
+        return self._cached('news', super().duckduckgo_news, query, kwargs)
+
+    def _cached(self, kind, search, query, options):
+        results = self.store.get_search(kind, query, options)
+        if results is not None:
+            logger.info(f"Source cache hit for {kind} query: {query}")
+            return results
+        results = search(query, **options)
+        if isinstance(results, str) and results:
+            self.store.set_search(kind, query, options, results)
+        return results
+
+class CachedNewspaper4kTools(Newspaper4kTools):
+    """Newspaper4kTools that reuses pages already fetched and parsed for other articles"""
+
+    def __init__(self, store: SourceStore, **kwargs):
+        self.store = store
+        super().__init__(**kwargs)
+
+    @functools.wraps(Newspaper4kTools.read_article)
+    def read_article(self, url: str) -> str:
+        body = self.store.get_page(url)
+        if body is not None:
+            logger.info(f"Source cache hit for {url}")
+            return body
+        body = super().read_article(url)
+        # Failed fetches come back as an error string; only keep parsed articles
+        if isinstance(body, str) and body and not body.startswith('Error'):
+            self.store.set_page(url, body)
+        return body
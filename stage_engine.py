@@ -0,0 +1,192 @@
+import contextvars
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+from cancellation import check_cancelled
+from rate_limiter import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Token usage of the stage being run, for performance_metrics; concurrent
+# sub-calls of one stage (research fan-out, section drafting) share the dict
+stage_usage: contextvars.ContextVar = contextvars.ContextVar('stage_usage', default=None)
+
+def record_stage_usage(prompt: str, content) -> None:
+    """Add one agent call's estimated input and output tokens to the running stage"""
+    usage = stage_usage.get()
+    if usage is not None:
+        usage['input_tokens'] += estimate_tokens(prompt)
+        usage['output_tokens'] += estimate_tokens(content if isinstance(content, str) else '')
+
+def record_uncompacted_tokens(tokens: int) -> None:
+    """Note how large the running stage's input would have been without compaction"""
+    usage = stage_usage.get()
+    if usage is not None:
+        usage['uncompacted_input_tokens'] = (usage.get('uncompacted_input_tokens') or 0) + tokens
+
+class Stage:
+    """
+    One step of the article pipeline.
+
+    Args:
+        name: Stage name, also the article_versions.stage of its checkpoint
+        agent: Agent label stored with the checkpoint and metrics
+        run: Async callable taking the PipelineState and returning the stage output
+        depends_on: Stages whose output this one reads
+        status: Article status to set while the stage runs (None leaves it alone)
+        current_agent: current_agent to show while the stage runs
+        checkpoint: Save the output as an article version
+        required: A failure fails the article; optional stages are logged and skipped
+    """
+
+    def __init__(self, name: str, agent: str, run: Callable[['PipelineState'], Awaitable[Optional[str]]],
+                 depends_on: Optional[List[str]] = None, status: Optional[str] = None,
+                 current_agent: Optional[str] = None, checkpoint: bool = True, required: bool = True):
+        self.name = name
+        self.agent = agent
+        self.run = run
+        self.depends_on = depends_on or []
+        self.status = status
+        self.current_agent = current_agent or agent
+        self.checkpoint = checkpoint
+        self.required = required
+
+class PipelineState:
+    """
+    In-memory state of one article's run through the stage graph.
+
+    Outputs of stages completed in an earlier run are loaded from their
+    checkpoint the first time a later stage asks for them, and only then.
+    """
+
+    def __init__(self, db, article_id: str, prompt: str, target_length: str, research_scope: str,
+                 drafting_mode: str = 'single', manifest: Optional[List[Dict]] = None):
+        self.db = db
+        self.article_id = article_id
+        self.prompt = prompt
+        self.target_length = target_length
+        self.research_scope = research_scope
+        self.drafting_mode = drafting_mode
+        self.manifest = manifest or []
+        self.outputs: Dict[str, str] = {}
+        self.completed: set = set()
+        self.extras: Dict[str, object] = {}
+
+    def output(self, stage: str) -> Optional[str]:
+        """Output of a completed stage, loading its checkpoint if needed"""
+        if stage not in self.outputs:
+            entries = [entry for entry in self.manifest if entry['stage'] == stage]
+            if not entries:
+                return None
+            latest = max(entries, key=lambda entry: entry['created_at'])
+            version = self.db.get_article_version(latest['id'])
+            self.outputs[stage] = version['content'] if version else None
+        return self.outputs[stage]
+
+class StageGraph:
+    """
+    Runs stages in dependency order, checkpointing each output once.
+
+    Stages already checkpointed (per the manifest the state was built from)
+    are skipped, so the same graph both starts and resumes articles.
+    Completion is verified from the run's own state, not by re-querying.
+    The current job's cancellation token is checked before every stage and
+    every checkpoint.
+    """
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = self._ordered(stages)
+
+    @staticmethod
+    def _ordered(stages: List[Stage]) -> List[Stage]:
+        """Topological order that keeps declaration order where dependencies allow"""
+        by_name = {stage.name: stage for stage in stages}
+        ordered, done = [], set()
+
+        def visit(stage, path):
+            if stage.name in done:
+                return
+            if stage.name in path:
+                raise ValueError(f"Stage dependency cycle through {stage.name}")
+            for dependency in stage.depends_on:
+                if dependency not in by_name:
+                    raise ValueError(f"Stage {stage.name} depends on unknown stage {dependency}")
+                visit(by_name[dependency], path | {stage.name})
+            done.add(stage.name)
+            ordered.append(stage)
+
+        for stage in stages:
+            visit(stage, set())
+        return ordered
+
+    def completed_from_manifest(self, manifest: List[Dict]) -> set:
+        """Names of checkpointed stages that already have a version for their agent"""
+        existing = {(entry['stage'], entry['agent']) for entry in manifest}
+        return {stage.name for stage in self.stages if stage.checkpoint and (stage.name, stage.agent) in existing}
+
+    def missing_stages(self, state: PipelineState) -> List[str]:
+        return [f"{stage.name} by {stage.agent}" for stage in self.stages
+                if stage.required and stage.name not in state.completed]
+
+    async def run(self, state: PipelineState) -> PipelineState:
+        """Run every stage not yet completed; raises on the first failed required stage"""
+        db = state.db
+        for stage in self.stages:
+            if stage.name in state.completed:
+                continue
+
+            check_cancelled()
+            if stage.status:
+                db.update_article_status(state.article_id, stage.status, stage.current_agent)
+
+            logger.info(f"Running stage {stage.name} for article {state.article_id}")
+            usage = {'input_tokens': 0, 'output_tokens': 0, 'uncompacted_input_tokens': None}
+            usage_token = stage_usage.set(usage)
+            metric_id = self._start_metric(db, state.article_id, stage)
+            try:
+                output = await stage.run(state)
+            except Exception as e:
+                self._end_metric(db, metric_id, usage, error_message=str(e))
+                if stage.required:
+                    raise Exception(f"Stage {stage.name} failed: {str(e)}") from e
+                logger.warning(f"Optional stage {stage.name} failed for article {state.article_id}: {str(e)}")
+                continue
+            finally:
+                stage_usage.reset(usage_token)
+            self._end_metric(db, metric_id, usage)
+
+            # Don't write versions for an article that was paused or deleted meanwhile
+            check_cancelled()
+            if stage.checkpoint:
+                db.update_article_content(state.article_id, output, stage.agent, stage.name)
+            state.outputs[stage.name] = output
+            state.completed.add(stage.name)
+
+        missing = self.missing_stages(state)
+        if missing:
+            raise Exception(f"Missing stages: {', '.join(missing)}")
+        return state
+
+    @staticmethod
+    def _start_metric(db, article_id: str, stage: Stage) -> Optional[str]:
+        try:
+            return db.track_performance_start(article_id, stage.name, stage.agent)
+        except Exception as e:
+            logger.warning(f"Failed to record metrics for {stage.name}: {str(e)}")
+            return None
+
+    @staticmethod
+    def _end_metric(db, metric_id: Optional[str], usage: Dict, error_message: Optional[str] = None) -> None:
+        if metric_id is None:
+            return
+        try:
+            db.track_performance_end(
+                metric_id,
+                success=error_message is None,
+                error_message=error_message,
+                tokens_used=usage['input_tokens'] + usage['output_tokens'],
+                input_tokens=usage['input_tokens'],
+                output_tokens=usage['output_tokens'],
+                uncompacted_input_tokens=usage['uncompacted_input_tokens']
+            )
+        except Exception as e:
+            logger.warning(f"Failed to record metrics: {str(e)}")
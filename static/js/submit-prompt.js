@@ -25,16 +25,37 @@ if (form) {
             const formData = new FormData(form);
             
             console.log('Sending submit request...');
-            const response = await fetch(form.action, {
+            let response = await fetch(form.action, {
                 method: 'POST',
                 body: formData
             });
             console.log('Response received:', response);
             
+            // A nearly identical prompt was already submitted
+            if (response.status === 409) {
+                const data = await response.json();
+                if (data.redirect && confirm(`${data.error}\n\nOpen the existing article instead?`)) {
+                    window.location.href = data.redirect;
+                    return;
+                }
+                if (!confirm(`${data.error}\n\nSubmit anyway?`)) {
+                    throw new Error('Submission cancelled');
+                }
+                formData.append('allow_duplicate', '1');
+                response = await fetch(form.action, {
+                    method: 'POST',
+                    body: formData
+                });
+            }
+            
             if (response.ok) {
+                const data = await response.json();
+                const duplicates = data.duplicates || [];
+                
                 // Update toast message
-                document.querySelector('#submit-toast .toast-body').textContent = 
-                    'Prompt submitted successfully! Redirecting to prompts page...';
+                document.querySelector('#submit-toast .toast-body').textContent = duplicates.length
+                    ? `Prompt submitted. Note: it closely matches "${duplicates[0].title}". Redirecting to prompts page...`
+                    : 'Prompt submitted successfully! Redirecting to prompts page...';
                 
                 // Redirect after a short delay
                 setTimeout(() => {
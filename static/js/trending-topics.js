@@ -87,11 +87,29 @@ document.getElementById('submit-article').addEventListener('click', async functi
     formData.append('topic_id', currentTopicId);
     
     try {
-        const response = await fetch('/api/create-article', {
+        let response = await fetch('/api/create-article', {
             method: 'POST',
             body: formData
         });
         
+        // A nearly identical prompt was already generated
+        if (response.status === 409) {
+            const data = await response.json();
+            if (data.redirect && confirm(`${data.error}\n\nOpen the existing article instead?`)) {
+                window.location.href = data.redirect;
+                return;
+            }
+            if (!confirm(`${data.error}\n\nCreate the article anyway?`)) {
+                topicModal.hide();
+                return;
+            }
+            formData.append('allow_duplicate', '1');
+            response = await fetch('/api/create-article', {
+                method: 'POST',
+                body: formData
+            });
+        }
+        
         if (response.ok) {
             const result = await response.json();
             window.location.href = `/prompts`;
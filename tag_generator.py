@@ -1,9 +1,13 @@
 import logging
 import re
+import threading
 from typing import List, Dict
 import google.generativeai as genai
 import os
 from dotenv import load_dotenv
+from cache import LRUCache
+from rate_limiter import (get_rate_limiter, estimate_tokens, is_rate_limit_error, retry_after_from_error,
+                          RateLimitBudgetExhausted)
 
 load_dotenv()
 
@@ -14,6 +18,15 @@ class TagGenerator:
         genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
         self.model = genai.GenerativeModel('gemini-1.5-flash')
         self.logger = logging.getLogger(__name__)
+        self.rate_limiter = get_rate_limiter()
+        
+        # Search tag suggestions memoized by normalized query
+        self._suggestion_cache = LRUCache(
+            max_entries=int(os.getenv('TAG_SUGGESTION_CACHE_ENTRIES', '1024')),
+            ttl=float(os.getenv('TAG_SUGGESTION_CACHE_TTL', str(24 * 3600)))
+        )
+        self._inflight_locks: Dict[str, threading.Lock] = {}
+        self._inflight_guard = threading.Lock()
     
     def generate_tags(self, title: str, content: str, max_tags: int = 8) -> List[str]:
         """
@@ -53,7 +66,7 @@ class TagGenerator:
             """
             
             # Generate tags using Gemini
-            response = self.model.generate_content(prompt)
+            response = self._generate_content(prompt)
             
             # Parse and clean the response
             tags = self._parse_tags_response(response.text)
@@ -145,27 +158,92 @@ class TagGenerator:
         return tags[:6]  # Return max 6 fallback tags
 
     def suggest_tags_for_search(self, query: str) -> List[str]:
-        """Suggest tags based on search query"""
+        """
+        Suggest tags based on search query.
+        
+        Results are memoized by normalized query with TTL and LRU eviction.
+        Concurrent requests for the same query wait for a single model call.
+        This runs in web requests, so it never waits for rate limit budget:
+        without budget it falls back to word-based suggestions.
+        """
+        key = self._normalize_query(query)
+        if not key:
+            return []
+        
+        cached = self._suggestion_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        with self._inflight_guard:
+            key_lock = self._inflight_locks.setdefault(key, threading.Lock())
+        
+        with key_lock:
+            # Another request may have filled the cache while we waited
+            cached = self._suggestion_cache.get(key)
+            if cached is not None:
+                return cached
+            
+            try:
+                tags = self._generate_search_suggestions(key)
+                self._suggestion_cache.set(key, tags)
+                return tags
+            except Exception as e:
+                if isinstance(e, RateLimitBudgetExhausted):
+                    self.logger.info(f"Skipping model tag suggestions: {str(e)}")
+                else:
+                    self.logger.error(f"Error suggesting tags: {str(e)}")
+                # Return simple word-based suggestions (not cached, so the model is retried later)
+                words = re.findall(r'\b[a-zA-Z]{3,}\b', key)
+                return words[:5]
+            finally:
+                with self._inflight_guard:
+                    self._inflight_locks.pop(key, None)
+    
+    def _normalize_query(self, query: str) -> str:
+        """Normalize a search query into a cache key"""
+        return ' '.join(re.findall(r'[a-z0-9]+', (query or '').lower()))
+    
+    def _generate_search_suggestions(self, query: str) -> List[str]:
+        """Ask the model for tags related to a search query"""
+        prompt = f"""
+        Based on this search query: "{query}"
+        
+        Suggest 5-8 related tags that someone might use to find similar content.
+        Focus on:
+        - Related topics and concepts
+        - Alternative terminology
+        - Broader and narrower categories
+        - Technical and non-technical terms
+        
+        Return only the tags as a comma-separated list.
+        """
+        
+        response = self._generate_content(prompt, blocking=False)
+        tags = self._parse_tags_response(response.text)
+        return self._validate_tags(tags, 8)
+    
+    def _generate_content(self, prompt: str, max_output_tokens: int = 200, blocking: bool = True):
+        """
+        Call Gemini through the shared rate limiter.
+
+        With blocking=False (web request paths) the call is never queued
+        behind the limiter: RateLimitBudgetExhausted is raised instead.
+        """
+        estimated_tokens = estimate_tokens(prompt) + max_output_tokens
+        if blocking:
+            self.rate_limiter.acquire_sync(tokens=estimated_tokens)
+        else:
+            wait = self.rate_limiter.try_acquire(tokens=estimated_tokens)
+            if wait > 0:
+                raise RateLimitBudgetExhausted(wait)
         try:
-            prompt = f"""
-            Based on this search query: "{query}"
-            
-            Suggest 5-8 related tags that someone might use to find similar content.
-            Focus on:
-            - Related topics and concepts
-            - Alternative terminology
-            - Broader and narrower categories
-            - Technical and non-technical terms
-            
-            Return only the tags as a comma-separated list.
-            """
-            
             response = self.model.generate_content(prompt)
-            tags = self._parse_tags_response(response.text)
-            return self._validate_tags(tags, 8)
-            
         except Exception as e:
-            self.logger.error(f"Error suggesting tags: {str(e)}")
-            # Return simple word-based suggestions
-            words = re.findall(r'\b[a-zA-Z]{3,}\b', query.lower())
-            return words[:5] 
\ No newline at end of file
+            # Callers fall back rather than retry, but the limiter still backs off
+            if is_rate_limit_error(e):
+                self.rate_limiter.on_rate_limited(retry_after_from_error(e))
+            raise
+        self.rate_limiter.on_success()
+        usage = getattr(response, 'usage_metadata', None)
+        self.rate_limiter.record_usage(estimated_tokens, getattr(usage, 'total_token_count', None))
+        return response
@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+from dotenv import load_dotenv
+from database import Database
+from agent_team import content_team, ArticleCreationService
+from search_index import SearchIndex
+from duplicate_index import content_index
+from cancellation import CancellationToken, current_token
+from scheduling import claim_settings
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+class JobWorker:
+    """
+    Drains the generation_jobs queue by running ArticleCreationService.
+
+    Jobs are claimed with a lease (claim_generation_job uses SKIP LOCKED), and
+    the lease is renewed from a heartbeat thread while the pipeline runs. If a
+    worker dies, its lease expires and another worker picks the job up, so
+    any number of worker processes on any number of hosts can share a queue.
+
+    Up to `concurrency` jobs run at once on the worker's event loop; agent
+    calls are offloaded to a thread pool, so pipelines overlap while waiting
+    on the model.
+
+    Jobs are claimed by priority rather than in arrival order: jobs close to
+    their deadline first, then weighted fair shares across priority classes,
+    with aging so no class starves (see scheduling.py and
+    claim_generation_job).
+
+    The heartbeat also polls the job every `cancel_poll_interval` seconds. A
+    pause (cancel_requested) or delete (job row gone) cancels the job's
+    CancellationToken, which stops the pipeline at its next check or agent
+    call and frees the slot.
+    """
+
+    def __init__(self, db: Database, service: ArticleCreationService, worker_id: Optional[str] = None,
+                 lease_seconds: int = 300, poll_interval: float = 5, retry_delay_seconds: int = 60,
+                 concurrency: int = 1, cancel_poll_interval: float = 3, scheduler: Optional[Dict] = None):
+        self.db = db
+        self.service = service
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.retry_delay_seconds = retry_delay_seconds
+        self.concurrency = max(1, concurrency)
+        self.cancel_poll_interval = cancel_poll_interval
+        self.scheduler = scheduler if scheduler is not None else claim_settings()
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        """Stop claiming new jobs; jobs in progress are allowed to finish"""
+        logger.info(f"Worker {self.worker_id} stopping after current jobs")
+        self._stopping.set()
+
+    async def run(self) -> None:
+        """Claim and run jobs until stopped, keeping up to `concurrency` in flight"""
+        logger.info(f"Worker {self.worker_id} started with concurrency {self.concurrency}")
+        running = set()
+        while not self._stopping.is_set():
+            job = None
+            if len(running) < self.concurrency:
+                try:
+                    job = self.db.claim_job(self.worker_id, self.lease_seconds, self.scheduler)
+                except Exception as e:
+                    logger.error(f"Failed to claim job: {str(e)}")
+
+            if job is not None:
+                running.add(asyncio.create_task(self.run_job(job)))
+                continue
+
+            # Full or idle: wait for a slot to free up, the poll interval, or stop
+            stop_wait = asyncio.create_task(self._stopping.wait())
+            done, _ = await asyncio.wait(
+                running | {stop_wait},
+                timeout=self.poll_interval,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            stop_wait.cancel()
+            running -= done
+
+        if running:
+            logger.info(f"Waiting for {len(running)} running jobs to finish")
+            await asyncio.gather(*running)
+        logger.info(f"Worker {self.worker_id} stopped")
+
+    async def run_job(self, job: Dict) -> None:
+        """Run one claimed job, keeping its lease alive, and record the outcome"""
+        logger.info(f"Running job {job['id']} ({job['kind']}), attempt {job['attempts']} of {job['max_attempts']}")
+        token = CancellationToken(asyncio.get_running_loop())
+        current_token.set(token)  # Each job runs in its own task, so this stays local to it
+        heartbeat_stop = threading.Event()
+        heartbeat = threading.Thread(target=self._keep_lease, args=(job['id'], heartbeat_stop, token), daemon=True)
+        heartbeat.start()
+        try:
+            result = await self.execute(job)
+            self.db.complete_job(job['id'], self.worker_id, article_id=result.get('id'))
+            logger.info(f"Job {job['id']} succeeded")
+        except Exception as e:
+            if token.cancelled:
+                self._record_cancellation(job, token.reason)
+            else:
+                logger.error(f"Job {job['id']} failed: {str(e)}")
+                try:
+                    self.db.fail_job(job, self.worker_id, str(e), self.retry_delay_seconds)
+                except Exception as inner_e:
+                    logger.error(f"Failed to record failure for job {job['id']}: {str(inner_e)}")
+        finally:
+            heartbeat_stop.set()
+            heartbeat.join()
+
+    def _record_cancellation(self, job: Dict, reason: str) -> None:
+        logger.info(f"Job {job['id']} cancelled: {reason}")
+        try:
+            self.db.cancel_job(job['id'], self.worker_id, reason)
+            # A stage may have overwritten the paused status before we noticed,
+            # but if the article has been resumed since, the new job owns it
+            if reason == 'paused' and job.get('article_id') and not self.db.get_active_job(job['article_id']):
+                self.db.update_article_status(job['article_id'], 'paused')
+        except Exception as e:
+            logger.error(f"Failed to record cancellation for job {job['id']}: {str(e)}")
+
+    async def execute(self, job: Dict) -> Dict[str, str]:
+        """Dispatch a job to the article service by kind"""
+        payload = job['payload']
+        # A retry shouldn't replay the cached responses that led to the failure
+        fresh = bool(payload.get('fresh')) or job['attempts'] > 1
+        if job['kind'] == 'create_article':
+            return await self.service.create_article(
+                prompt=payload['prompt'],
+                target_length=payload['target_length'],
+                research_scope=payload['research_scope'],
+                article_id=job.get('article_id'),
+                drafting_mode=payload.get('drafting_mode', 'single'),
+                fresh=fresh
+            )
+        if job['kind'] == 'resume_article':
+            return await self.service.resume_article(job['article_id'], fresh=fresh)
+        raise ValueError(f"Unknown job kind: {job['kind']}")
+
+    def _keep_lease(self, job_id: str, stop: threading.Event, token: CancellationToken) -> None:
+        """
+        Heartbeat thread: poll for cancellation and renew the lease at a third of its length.
+
+        Losing the lease also cancels the job, since another worker may now own it.
+        """
+        next_renewal = time.monotonic() + self.lease_seconds / 3
+        while not stop.wait(self.cancel_poll_interval):
+            try:
+                control = self.db.get_job_control(job_id)
+                if control is None:
+                    token.cancel('deleted')
+                    return
+                if control.get('cancel_requested'):
+                    token.cancel('paused')
+                    return
+                if time.monotonic() >= next_renewal:
+                    if not self.db.renew_job_lease(job_id, self.worker_id, self.lease_seconds):
+                        logger.warning(f"Lost lease on job {job_id}")
+                        token.cancel('lease lost')
+                        return
+                    next_renewal = time.monotonic() + self.lease_seconds / 3
+            except Exception as e:
+                logger.error(f"Heartbeat failed for job {job_id}: {str(e)}")
+
+def build_worker(db: Database, concurrency: Optional[int] = None) -> JobWorker:
+    """A JobWorker configured from the WORKER_* environment variables"""
+    search_index = SearchIndex(os.getenv('SEARCH_INDEX_PATH', 'data/search_index.json.gz'))
+    service = ArticleCreationService(db, content_team, search_index=search_index,
+                                     content_index=content_index(db))
+    return JobWorker(
+        db,
+        service,
+        lease_seconds=int(os.getenv('WORKER_LEASE_SECONDS', '300')),
+        poll_interval=float(os.getenv('WORKER_POLL_INTERVAL', '5')),
+        retry_delay_seconds=int(os.getenv('WORKER_RETRY_DELAY_SECONDS', '60')),
+        concurrency=concurrency or int(os.getenv('WORKER_CONCURRENCY', '4')),
+        cancel_poll_interval=float(os.getenv('WORKER_CANCEL_POLL_INTERVAL', '3'))
+    )
+
+def main():
+    db = Database(
+        url=os.getenv('SUPABASE_URL'),
+        key=os.getenv('SUPABASE_KEY')
+    )
+    worker = build_worker(db)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, worker.stop)
+        await worker.run()
+
+    asyncio.run(run())
+
+if __name__ == '__main__':
+    main()